@@ -1 +1,3 @@
 from evn.dev.contexts import *
+from evn.dev.timing import *
+from evn.dev.profiling import *
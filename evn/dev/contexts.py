@@ -6,13 +6,14 @@ Context Managers Utility Module
 This module provides a collection of useful and versatile **context managers**
 for handling various runtime behaviors. These include:
 
-- **Redirection of stdout/stderr:** Easily capture or redirect print output.
+- **Redirection of stdout/stderr:** Easily capture or redirect print output, per thread or asyncio task.
 - **Dynamic class casting:** Temporarily change an object's class.
 - **Automatic file handling:** Open multiple files and ensure proper cleanup.
 - **Temporary working directory changes:** Change directory and automatically revert.
 - **Capturing asserts and exceptions:** Capture exceptions for later inspection.
 - **Random seed state preservation:** Temporarily set a random seed for reproducibility.
 - **Debugging tools:** Trace print statements with stack traces and capture stdio.
+- **File descriptor capture:** Capture output of native code and subprocesses, optionally only the tail.
 - **Suppressing optional imports:** Cleanly handle optional imports without crashing.
 
 ### **💡 Why Use These Context Managers?**
@@ -48,6 +49,13 @@ with capture_stdio() as captured:
 print("Captured text:", captured.getvalue())
 ```
 
+### **Capture Everything Written to stdout/stderr, Keeping the Last 1MB**
+```python
+with capture_fds(maxbytes=1 << 20) as captured:
+    os.system("make")
+print(captured.read())
+```
+
 ### **Capture Assertion Errors**
 ```python
 with capture_asserts() as errors:
@@ -63,9 +71,12 @@ with optional_imports():
 """
 
 import atexit
+import ctypes
+import contextvars
 import io
 import os
 import sys
+import threading
 import traceback
 import contextlib
 
@@ -103,22 +114,63 @@ def nocontext():
         pass
 
 class TracePrints(object):
+    """
+    Stand-in for stdout that shows where writes come from.
 
-    def __init__(self):
-        self.stdout = sys.stdout
+    By default every write is shown with its stack. With aggregate, writes pass through unchanged and only
+    the call site (file:line:function) of each is recorded, counting writes and bytes per site; summary()
+    gives the table. With sample=n only every nth write is looked up, and the counts are scaled by n.
+    """
+
+    def __init__(self, aggregate=False, sample=1):
+        self.stdout = getattr(sys.stdout, 'target', sys.stdout)
+        self.aggregate, self.sample = aggregate, sample
+        self.sites, self.nwrites = {}, 0
+        self._lock = threading.Lock()  # writes come from every thread
 
     def write(self, s):
-        self.stdout.write("Writing %r\n" % s)
-        traceback.print_stack(file=self.stdout)
+        if not self.aggregate:
+            self.stdout.write("Writing %r\n" % s)
+            traceback.print_stack(file=self.stdout)
+            return
+        with self._lock:
+            self.nwrites += 1
+            if self.nwrites % self.sample == 0:
+                frame = sys._getframe(1)
+                while frame.f_back and frame.f_code.co_filename == __file__:
+                    frame = frame.f_back
+                site = (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+                counts = self.sites.get(site)
+                if counts is None: counts = self.sites[site] = [0, 0]
+                counts[0] += 1
+                counts[1] += len(s)
+        return self.stdout.write(s)
 
     def flush(self):
         self.stdout.flush()
 
+    def summary(self, top=20):
+        """Table of the top call sites by bytes written."""
+        rows = sorted(self.sites.items(), key=lambda item: -item[1][1])[:top]
+        sampled = f', sampled 1/{self.sample}' if self.sample > 1 else ''
+        lines = [f'trace_prints: {self.nwrites} writes from {len(self.sites)} call sites{sampled}',
+                 f'{"writes":>10} {"bytes":>12}  call site']
+        for (file, line, func), (nwrites, nbytes) in rows:
+            lines.append(f'{nwrites * self.sample:>10} {nbytes * self.sample:>12}  {file}:{line}:{func}')
+        return '\n'.join(lines) + '\n'
+
 @contextlib.contextmanager
-def trace_prints():
-    tp = TracePrints()
-    with redirect(stdout=tp):
-        yield tp
+def trace_prints(aggregate=False, sample=1, top=20):
+    """
+    Trace writes to stdout from every thread, see TracePrints. With aggregate, the summary table is printed
+    on exit.
+    """
+    tp = TracePrints(aggregate, sample)
+    try:
+        with redirect(stdout=tp, local=False):
+            yield tp
+    finally:
+        if aggregate: tp.stdout.write(tp.summary(top))
 
 @contextlib.contextmanager
 def catch_em_all():
@@ -130,29 +182,90 @@ def catch_em_all():
     finally:
         pass
 
+_stdout_target = contextvars.ContextVar('evn_stdout_target', default=None)
+_stderr_target = contextvars.ContextVar('evn_stderr_target', default=None)
+_install_lock = threading.Lock()
+
+class ContextLocalStream(object):
+    """
+    Stand-in for sys.stdout / sys.stderr that writes to the stream redirect() set for the current thread or
+    asyncio task, or else to the stream it replaced.
+
+    New threads start without a redirect; asyncio tasks inherit the one active where they were created.
+    """
+
+    def __init__(self, var, default):
+        self.var, self.default = var, default
+
+    @property
+    def target(self):
+        target = self.var.get()
+        return self.default if target is None else target
+
+    def write(self, s):
+        return self.target.write(s)
+
+    def flush(self):
+        return self.target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.target, name)
+
+def context_local_stdio():
+    """
+    Replace sys.stdout and sys.stderr with ContextLocalStreams, unless they already are.
+
+    Returns:
+        tuple: (sys.stdout, sys.stderr)
+    """
+    with _install_lock:
+        if not isinstance(sys.stdout, ContextLocalStream):
+            sys.stdout = ContextLocalStream(_stdout_target, sys.stdout)
+        if not isinstance(sys.stderr, ContextLocalStream):
+            sys.stderr = ContextLocalStream(_stderr_target, sys.stderr)
+    return sys.stdout, sys.stderr
+
 @contextlib.contextmanager
-def redirect(stdout=sys.stdout, stderr=sys.stderr):
+def redirect(stdout=sys.stdout, stderr=sys.stderr, local=True):
     """
     Temporarily redirect the stdout and stderr streams.
 
     Parameters:
         stdout (file-like or None): Target for stdout (default: sys.stdout).
         stderr (file-like, 'stdout', or None): Target for stderr (default: sys.stderr).
+        local (bool): Only redirect the current thread or asyncio task, see ContextLocalStream. Otherwise
+            swap sys.stdout and sys.stderr for the whole process.
 
     Yields:
         tuple: (stdout, stderr) during redirection.
     """
+    if stdout is None:
+        stdout = io.StringIO()
+    if stderr == 'stdout':
+        stderr = stdout
+    elif stderr is None:
+        stderr = io.StringIO()
+    if not local:
+        with _redirect_global(stdout, stderr):
+            yield stdout, stderr
+        return
+    context_local_stdio()
+    sys.stdout.flush(), sys.stderr.flush()
+    tokens = _stdout_target.set(stdout), _stderr_target.set(stderr)
+    try:
+        yield stdout, stderr
+    finally:
+        sys.stdout.flush(), sys.stderr.flush()
+        _stdout_target.reset(tokens[0])
+        _stderr_target.reset(tokens[1])
+
+@contextlib.contextmanager
+def _redirect_global(stdout, stderr):
     _out, _err = sys.stdout, sys.stderr
     try:
         sys.stdout.flush(), sys.stderr.flush()
-        if stdout is None:
-            stdout = io.StringIO()
-        if stderr == 'stdout':
-            stderr = stdout
-        elif stderr is None:
-            stderr = io.StringIO()
         sys.stdout, sys.stderr = stdout, stderr
-        yield stdout, stderr
+        yield
     finally:
         sys.stdout.flush(), sys.stderr.flush()
         sys.stdout, sys.stderr = _out, _err
@@ -183,20 +296,86 @@ def just_stdout():
         pass
 
 @contextlib.contextmanager
-def capture_stdio():
+def capture_stdio(local=True):
     """
     Capture standard output and error.
 
+    Parameters:
+        local (bool): Only capture the current thread or asyncio task, see redirect.
+
     Yields:
         io.StringIO: The captured stdout buffer.
     """
-    with redirect(None, 'stdout') as (out, err):
+    with redirect(None, 'stdout', local=local) as (out, err):
         try:
             yield out
         finally:
             out.seek(0)
             err.seek(0)
 
+class FdCapture(object):
+    """
+    Bytes read by capture_fds. With maxbytes, only the last maxbytes are kept and dropped counts the rest.
+    """
+
+    def __init__(self, maxbytes=None):
+        self.maxbytes, self.data, self.dropped = maxbytes, bytearray(), 0
+
+    def append(self, chunk):
+        self.data += chunk
+        if self.maxbytes is not None and len(self.data) > self.maxbytes:
+            excess = len(self.data) - self.maxbytes
+            del self.data[:excess]
+            self.dropped += excess
+
+    def read(self, encoding='utf-8', errors='replace'):
+        return self.data.decode(encoding, errors)
+
+@contextlib.contextmanager
+def capture_fds(fds=(1, 2), maxbytes=None):
+    """
+    Capture everything written to file descriptors, by default stdout and stderr.
+
+    Unlike capture_stdio, this also catches output of native code (std::cout, printf) and subprocesses.
+    The fds are dup2'd onto a pipe drained by a reader thread, so a long run does not block on a full pipe,
+    and with maxbytes memory stays bounded. Background processes still holding the fds keep the context from
+    exiting until they exit.
+
+    Parameters:
+        fds (tuple): File descriptors to capture, all into the same buffer.
+        maxbytes (int or None): Keep only the last maxbytes.
+
+    Yields:
+        FdCapture: The captured bytes; complete once the context exits.
+    """
+    captured = FdCapture(maxbytes)
+    _flush_all()
+    read_end, write_end = os.pipe()
+    saved = [os.dup(fd) for fd in fds]
+    reader = threading.Thread(target=_drain_fd, args=(read_end, captured), daemon=True)
+    reader.start()
+    try:
+        for fd in fds:
+            os.dup2(write_end, fd)
+        os.close(write_end)
+        yield captured
+    finally:
+        _flush_all()
+        for fd, orig in zip(fds, saved):
+            os.dup2(orig, fd)
+            os.close(orig)
+        reader.join()
+
+def _drain_fd(fd, captured):
+    with open(fd, 'rb', buffering=0) as inp:
+        while chunk := inp.read(1 << 16):
+            captured.append(chunk)
+
+def _flush_all():
+    sys.stdout.flush(), sys.stderr.flush()
+    with contextlib.suppress(Exception):
+        ctypes.CDLL(None).fflush(None)  # C stdio buffers, e.g. printf in extensions
+
 @contextlib.contextmanager
 def capture_asserts():
     """
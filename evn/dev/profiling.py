@@ -0,0 +1,207 @@
+"""
+low overhead profiling helpers
+
+`sample_profile` samples the Python stack of the main thread from a SIGPROF (cpu time) or SIGALRM (wall
+time) interval timer. Unlike cProfile, nothing happens between samples, so the relative cost of native calls
+and regex heavy code is not distorted. Python runs signal handlers between bytecodes, so the timer signals
+of a long native call arrive as one, after it returns; each sample is weighted by the intervals elapsed
+since the previous one, so that time is still counted, against the frame that made the call::
+
+    with sample_profile(output='profile.collapsed'):
+        run()
+
+`track_memory` records the peak of traced memory and the allocation sites that grew most, from tracemalloc
+snapshots taken on entry and exit::
+
+    with track_memory() as mem:
+        format_buffer(huge)
+    print(mem.report(group_by='traceback'))
+"""
+
+import contextlib
+import os
+import signal
+import time
+import tracemalloc
+
+_timers = {}
+if hasattr(signal, 'setitimer'):  # not on windows
+    _timers = dict(cpu=(signal.ITIMER_PROF, signal.SIGPROF), wall=(signal.ITIMER_REAL, signal.SIGALRM))
+_clocks = dict(cpu=time.process_time, wall=time.perf_counter)
+
+class StackSampler:
+    """
+    Samples taken by sample_profile, counted in timer intervals: per full stack, and per line being executed.
+    """
+
+    def __init__(self, interval=0.001, mode='cpu'):
+        assert mode in _timers, f'mode must be one of {list(_timers)} on this platform'
+        self.interval, self.mode, self.clock = interval, mode, _clocks[mode]
+        self.stacks, self.lines, self.nsamples = {}, {}, 0
+
+    def sample(self, signum, frame):
+        now = self.clock()
+        ticks = max(1, round((now - self.last) / self.interval))
+        self.last = now
+        self.nsamples += ticks
+        line = (frame.f_code, frame.f_lineno)
+        self.lines[line] = self.lines.get(line, 0) + ticks
+        stack = []
+        while frame is not None:
+            stack.append(frame.f_code)
+            frame = frame.f_back
+        stack = tuple(stack)
+        self.stacks[stack] = self.stacks.get(stack, 0) + ticks
+
+    def start(self):
+        timer, signum = _timers[self.mode]
+        self._previous = signal.signal(signum, self.sample)
+        self.last = self.clock()
+        signal.setitimer(timer, self.interval, self.interval)
+
+    def stop(self):
+        timer, signum = _timers[self.mode]
+        signal.setitimer(timer, 0)
+        signal.signal(signum, self._previous)
+
+    def collapsed(self):
+        """One 'outer;...;inner count' line per distinct stack, the input format of flamegraph.pl."""
+        lines = (f'{";".join(_code_name(c) for c in reversed(stack))} {n}' for stack, n in self.stacks.items())
+        return ''.join(f'{line}\n' for line in sorted(lines))
+
+    def summary(self, top=20):
+        """Table of the top functions by samples in the function itself, with samples including callees."""
+        own, total = {}, {}
+        for stack, n in self.stacks.items():
+            own[stack[0]] = own.get(stack[0], 0) + n
+            for code in set(stack):
+                total[code] = total.get(code, 0) + n
+        hot_lines = sorted(self.lines.items(), key=lambda item: -item[1])[:top]
+        rows = sorted(total, key=lambda code: (-own.get(code, 0), -total[code]))[:top]
+        n = max(1, self.nsamples)
+        out = [f'{self.nsamples} samples every {self.interval * 1000:g}ms of {self.mode} time',
+               f'{"self":>7} {"self%":>6} {"total":>7} {"total%":>6}  function']
+        for code in rows:
+            out.append(f'{own.get(code, 0):>7} {100 * own.get(code, 0) / n:>6.1f} {total[code]:>7} '
+                       f'{100 * total[code] / n:>6.1f}  {_code_name(code)}')
+        out.append(f'{"self":>7} {"self%":>6}  line')
+        for (code, lineno), count in hot_lines:
+            out.append(f'{count:>7} {100 * count / n:>6.1f}  {code.co_filename}:{lineno} ({code.co_name})')
+        return '\n'.join(out) + '\n'
+
+    def report(self, format='summary', top=20):
+        assert format in ('summary', 'collapsed'), f'unknown profile format {format}'
+        return self.summary(top) if format == 'summary' else self.collapsed()
+
+@contextlib.contextmanager
+def sample_profile(interval=0.001, mode='cpu', output=None, format=None, top=20):
+    """
+    Sample the main thread's Python stack every interval seconds of cpu or wall time.
+
+    Parameters:
+        interval (float): Seconds between samples.
+        mode (str): 'cpu' (SIGPROF) or 'wall' (SIGALRM).
+        output (str, file-like or None): Where to write the report on exit, if anywhere.
+        format (str or None): 'summary' or 'collapsed'. By default collapsed if output is a path ending in
+            .collapsed or .folded, else summary.
+        top (int): Rows in the summary.
+
+    Yields:
+        StackSampler: The samples, complete once the context exits.
+    """
+    sampler = StackSampler(interval, mode)
+    sampler.start()
+    try:
+        yield sampler
+    finally:
+        sampler.stop()
+        if output is not None:
+            if format is None:
+                format = 'collapsed' if str(output).endswith(('.collapsed', '.folded')) else 'summary'
+            report = sampler.report(format, top)
+            if hasattr(output, 'write'): output.write(report)
+            else:
+                with open(output, 'w') as out:
+                    out.write(report)
+
+class MemoryTracker:
+    """
+    Peak and before / after tracemalloc snapshots recorded by track_memory.
+    """
+
+    def __init__(self, nframes=1):
+        self.nframes, self.peak, self.before, self.after = nframes, 0, None, None
+        self._stop = False
+
+    def start(self):
+        self._stop = not tracemalloc.is_tracing()
+        if self._stop: tracemalloc.start(self.nframes)
+        tracemalloc.reset_peak()
+        self.start_size = tracemalloc.get_traced_memory()[0]
+        self.before = _snapshot()
+
+    def stop(self):
+        size, peak = tracemalloc.get_traced_memory()
+        self.peak, self.size = peak - self.start_size, size - self.start_size
+        self.after = _snapshot()
+        if self._stop: tracemalloc.stop()
+
+    def top(self, n=10, group_by='lineno'):
+        """The n allocation sites ('lineno', 'filename' or 'traceback') that grew most, as StatisticDiffs."""
+        return self.after.compare_to(self.before, group_by)[:n]
+
+    def report(self, n=10, group_by='lineno'):
+        out = [f'peak {_size(self.peak)}, {_size(self.size)} still allocated, top {n} sites by {group_by}:']
+        for stat in self.top(n, group_by):
+            out.append(f'{_size(stat.size_diff):>12} {stat.count_diff:>+9} blocks  {stat.traceback[-1]}')
+            if group_by == 'traceback':
+                out.extend(f'{"":>32}{frame}' for frame in reversed(stat.traceback[:-1]))
+        return '\n'.join(out) + '\n'
+
+@contextlib.contextmanager
+def track_memory(nframes=1, output=None, top=10, group_by='lineno'):
+    """
+    Track Python memory allocations with tracemalloc.
+
+    Parameters:
+        nframes (int): Frames kept per allocation, more than 1 for group_by='traceback'. Ignored if
+            tracemalloc is already tracing.
+        output (str, file-like or None): Where to write the report on exit, if anywhere.
+        top (int): Allocation sites in the report.
+        group_by (str): 'lineno', 'filename' or 'traceback'.
+
+    Yields:
+        MemoryTracker: peak and size (bytes above the start), before and after snapshots.
+
+    Example:
+        >>> with track_memory() as mem:
+        ...     data = [bytes(1000) for _ in range(1000)]
+        >>> mem.peak > 1_000_000
+        True
+    """
+    tracker = MemoryTracker(nframes)
+    tracker.start()
+    try:
+        yield tracker
+    finally:
+        tracker.stop()
+        if output is not None:
+            report = tracker.report(top, group_by)
+            if hasattr(output, 'write'): output.write(report)
+            else:
+                with open(output, 'w') as out:
+                    out.write(report)
+
+def _snapshot():
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__),
+              tracemalloc.Filter(False, '<frozen importlib._bootstrap*>')]
+    return tracemalloc.take_snapshot().filter_traces(ignore)
+
+def _size(nbytes):
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(nbytes) < 1024: return f'{nbytes:.0f}{unit}' if unit == 'B' else f'{nbytes:.1f}{unit}'
+        nbytes /= 1024
+    return f'{nbytes:.1f}GiB'
+
+def _code_name(code):
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
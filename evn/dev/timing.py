@@ -0,0 +1,170 @@
+"""
+hierarchical timing of nested code sections
+
+`timed` is a context manager and decorator. Nested sections form a tree of count / total / min / max,
+recorded per thread without locking and merged when reported, as a table, JSON or collapsed stacks
+(the text format of flamegraph.pl, speedscope and friends)::
+
+    with timed('load'):
+        data = load()
+    @timed
+    def process(data): ...
+    print(timings.report())
+"""
+
+from dataclasses import dataclass, field
+import functools
+import json
+import threading
+from time import perf_counter
+
+_children_lock = threading.Lock()  # new sections are rare, report() may merge while threads record
+
+@dataclass
+class TimingNode:
+    """Timings of one section, as called from its parent section."""
+    name: str
+    count: int = 0
+    total: float = 0.0
+    min: float = float('inf')
+    max: float = 0.0
+    children: dict = field(default_factory=dict)
+
+    def child(self, name):
+        node = self.children.get(name)
+        if node is None:
+            with _children_lock:
+                node = self.children[name] = TimingNode(name)
+        return node
+
+    def add(self, elapsed):
+        self.count += 1
+        self.total += elapsed
+        if elapsed < self.min: self.min = elapsed
+        if elapsed > self.max: self.max = elapsed
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.min, self.max = min(self.min, other.min), max(self.max, other.max)
+        with _children_lock:
+            children = list(other.children.items())
+        for name, child in children:
+            if child.count: self.child(name).merge(child)  # skip sections that have not finished yet
+
+    @property
+    def self_time(self):
+        # a section open again may have spent more in its children so far than in its finished runs
+        return max(0.0, self.total - sum(c.total for c in self.children.values()))
+
+    def walk(self, path=()):
+        """Yield (path, node) for each node below this one, depth first."""
+        for child in self.children.values():
+            yield path + (child.name, ), child
+            yield from child.walk(path + (child.name, ))
+
+    def to_dict(self):
+        return dict(name=self.name, count=self.count, total=self.total, max=self.max,
+                    min=self.min if self.count else None,  # inf is not valid JSON
+                    children=[c.to_dict() for c in self.children.values()])
+
+class Timings:
+    """
+    Timing trees recorded by timed, one per thread, merged by tree() and report().
+
+    Example:
+        >>> t = Timings()
+        >>> with timed('outer', t):
+        ...     for i in range(3):
+        ...         with timed('inner', t): pass
+        >>> [(path, node.count) for path, node in t.tree().walk()]
+        [(('outer',), 1), (('outer', 'inner'), 3)]
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._roots = []
+        self._lock = threading.Lock()
+
+    def stack(self):
+        """The current thread's stack of (node, start time) of open sections, starting at its root node."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = [(TimingNode(''), 0.0)]
+            with self._lock:
+                self._roots.append(stack[0][0])
+        return stack
+
+    def clear(self):
+        with self._lock, _children_lock:
+            for root in self._roots:
+                root.children.clear()
+
+    def tree(self):
+        """All threads' timings merged into one tree. Sections that have not finished once yet are left out,
+        with the sections inside them."""
+        merged = TimingNode('')
+        with self._lock:
+            for root in self._roots:
+                merged.merge(root)
+        return merged
+
+    def report(self, format='table'):
+        """Timings as 'table', 'json' or 'collapsed' stacks (self time in microseconds)."""
+        tree = self.tree()
+        if format == 'json':
+            return json.dumps([c.to_dict() for c in tree.children.values()], indent=2)
+        if format == 'collapsed':
+            return ''.join(f'{";".join(path)} {round(node.self_time * 1e6)}\n' for path, node in tree.walk())
+        assert format == 'table', f'unknown timing report format {format}'
+        lines = [f'{"section":<40} {"count":>8} {"total":>10} {"mean":>10} {"min":>10} {"max":>10}']
+        for path, node in tree.walk():
+            name = '  ' * (len(path) - 1) + node.name
+            lines.append(f'{name:<40} {node.count:>8} {node.total:>10.4f} {node.total / node.count:>10.4f} '
+                         f'{node.min:>10.4f} {node.max:>10.4f}')
+        return '\n'.join(lines) + '\n'
+
+timings = _default_timings = Timings()
+
+class timed:
+    """
+    Time a section as a child of the enclosing timed section. Usable as a context manager or decorator,
+    with or without a name (a decorated function defaults to its qualified name).
+
+    Example:
+        >>> t = Timings()
+        >>> @timed(timings=t)
+        ... def work(): pass
+        >>> with timed('job', t) as job:
+        ...     work()
+        >>> job.elapsed > 0, [path for path, _ in t.tree().walk()]
+        (True, [('job',), ('job', 'work')])
+    """
+
+    def __new__(cls, name=None, timings=None):
+        if callable(name): return cls(None, timings)(name)  # bare @timed
+        return super().__new__(cls)
+
+    def __init__(self, name=None, timings=None):
+        self.name, self.elapsed = name, 0.0
+        self.timings = _default_timings if timings is None else timings
+
+    def __enter__(self):
+        stack = self.timings.stack()
+        stack.append((stack[-1][0].child(self.name), perf_counter()))
+        return self
+
+    def __exit__(self, *_):
+        node, start = self.timings.stack().pop()
+        self.elapsed = perf_counter() - start
+        node.add(self.elapsed)
+
+    def __call__(self, func):
+        name, timings = self.name or func.__qualname__, self.timings
+
+        @functools.wraps(func)
+        def wrapper(*args, **kw):
+            with timed(name, timings):
+                return func(*args, **kw)
+
+        return wrapper
@@ -1,4 +1,5 @@
 // format_identifier.cpp
+#pragma once
 #include <algorithm>
 #include <cctype>
 #include <iostream>
@@ -16,7 +17,6 @@
 
 namespace py = pybind11;
 using namespace std;
-bool debug = false;
 
 enum class TokenType {
     Identifier,
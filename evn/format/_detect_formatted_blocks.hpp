@@ -1,3 +1,4 @@
+#pragma once
 #include "_common.hpp"
 
 // Character group indices for substitution matrix
@@ -146,14 +147,31 @@ array<array<float, NUM_GROUPS>, NUM_GROUPS> create_default_submatrix() {
     return matrix;
 }
 
-class IdentifyFormattedBlocks {
-  public:
-    array<array<float, NUM_GROUPS>, NUM_GROUPS> sub_matrix;
+// Per-call state for mark_formtted_blocks / unmark, kept off the class so one
+// IdentifyFormattedBlocks can be shared between threads
+struct MarkState {
     bool in_formatted_block = false;
     vector<string> lines, output;
     vector<float> scores;
     size_t consecutive_high_scores = 0;
+
+    MarkState(string const &code) {
+        istringstream stream(code);
+        string line;
+        while (getline(stream, line)) lines.push_back(line);
+    }
+    string finish_code() const {
+        ostringstream result;
+        for (const string &line : output) { result << line << endl; }
+        return result.str();
+    }
+};
+
+class IdentifyFormattedBlocks {
+  public:
+    array<array<float, NUM_GROUPS>, NUM_GROUPS> sub_matrix;
     float threshold = 5.0f;
+    bool debug = false;
 
     IdentifyFormattedBlocks(float threshold = 5.0f) : threshold(threshold) {
         sub_matrix = create_default_submatrix();
@@ -164,7 +182,7 @@ class IdentifyFormattedBlocks {
     }
 
     // Compute similarity score between two lines
-    float compute_similarity_score(string const &line1, string const &line2) {
+    float compute_similarity_score(string const &line1, string const &line2) const {
         if (debug) cerr << "compute_similarity_score " << line1 << " " << line2 << endl;
         if (line1.empty() || line2.empty()) return 0.0f;
         size_t indent1 = line1.find_first_not_of(" \t");
@@ -196,67 +214,51 @@ class IdentifyFormattedBlocks {
         return 0.7f * alignmentScore + 0.3f * lengthPenalty;
     }
 
-    string unmark(string const &code) {
-        start_new_code(code);
-        if (lines.empty()) return code;
+    string unmark(string const &code) const {
+        MarkState st(code);
+        if (st.lines.empty()) return code;
 
-        for (string const &line : lines) {
+        for (string const &line : st.lines) {
             if (line.find("#             fmt:") != string::npos) continue;
-            if (is_whitespace(line) && output.size() && is_whitespace(output.back()))
+            if (is_whitespace(line) && st.output.size() && is_whitespace(st.output.back()))
                 continue;
-            output.push_back(line);
+            st.output.push_back(line);
         }
-        ostringstream result;
-        for (string const &line : output) { result << line << endl; }
-        return result.str();
-    }
-
-    void start_new_code(string const &code) {
-        lines.clear();
-        output.clear();
-        scores.clear();
-        istringstream stream(code);
-        string line;
-        while (getline(stream, line)) lines.push_back(line);
-        in_formatted_block = false;
-    }
-    string finish_code() {
-        ostringstream result;
-        for (const string &line : output) { result << line << endl; }
-        return result.str();
+        return st.finish_code();
     }
 
     // Process code to identify and mark well-formatted blocks
-    string mark_formtted_blocks(string const &code, float thresh = 0) {
-        start_new_code(code);
-        if (thresh > 0) threshold = thresh;
+    string mark_formtted_blocks(string const &code, float thresh = 0) const {
+        MarkState st(code);
+        float threshold = thresh > 0 ? thresh : this->threshold;
+        vector<string> const &lines = st.lines;
+        vector<string> &output = st.output;
         if (lines.empty()) return code;
         output.push_back(lines[0]);
 
-        consecutive_high_scores = 0;
         for (size_t i = 1; i < lines.size(); i++) {
             if (is_multiline(lines[i - 1]) || is_multiline(lines[i])) {
                 if (debug) cerr << "multiline " << lines[i] << endl;
-                maybe_close_formatted_block();
+                maybe_close_formatted_block(st);
                 output.push_back(lines[i]);
                 continue;
             }
             string i_indent = get_indentation(lines[i]);
-            if (!in_formatted_block && is_oneline_statement_string(lines[i])) {
+            if (!st.in_formatted_block && is_oneline_statement_string(lines[i])) {
                 if (debug) cerr << "oneline " << lines[i] << endl;
-                maybe_close_formatted_block();
+                maybe_close_formatted_block(st);
                 // cout << "single " << lines[i] << endl;
                 output.push_back(i_indent + "#             fmt: off");
                 output.push_back(lines[i]);
                 output.push_back(i_indent + "#             fmt: on");
                 continue;
             }
-            scores.push_back(compute_similarity_score(lines[i - 1], lines[i]));
-            if (scores.back() >= threshold) {
-                if (debug) cerr << "block " << scores.back() << " " << lines[i] << endl;
-                consecutive_high_scores++;
-                if (consecutive_high_scores >= 1 && !in_formatted_block) {
-                    in_formatted_block = true;
+            st.scores.push_back(compute_similarity_score(lines[i - 1], lines[i]));
+            if (st.scores.back() >= threshold) {
+                if (debug) cerr << "block " << st.scores.back() << " " << lines[i] << endl;
+                st.consecutive_high_scores++;
+                if (st.consecutive_high_scores >= 1 && !st.in_formatted_block) {
+                    st.in_formatted_block = true;
                     string tmp = output.back();
                     output.back() = i_indent + "#             fmt: off";
                     output.push_back(tmp);
@@ -264,35 +266,33 @@ class IdentifyFormattedBlocks {
                     continue;
                 }
             } else {
-                maybe_close_formatted_block();
+                maybe_close_formatted_block(st);
             }
             output.push_back(lines[i]);
         }
-        maybe_close_formatted_block(true);
-        return finish_code();
+        maybe_close_formatted_block(st, true);
+        return st.finish_code();
     }
-    void maybe_close_formatted_block(bool at_end = false) {
-        if (!in_formatted_block) return;
+    void maybe_close_formatted_block(MarkState &st, bool at_end = false) const {
+        if (!st.in_formatted_block) return;
         if (debug) cerr << "maybe close block" << endl;
-        consecutive_high_scores = 0;
-        in_formatted_block = false;
+        st.consecutive_high_scores = 0;
+        st.in_formatted_block = false;
         string indent = "!!";
-        assert(output.size());
-        for (size_t i = output.size() - 1; i > 0; --i) {
-            if (output[i].find("#             fmt:") == string::npos) {
-                indent = get_indentation(output[i]);
+        assert(st.output.size());
+        for (size_t i = st.output.size() - 1; i > 0; --i) {
+            if (st.output[i].find("#             fmt:") == string::npos) {
+                indent = get_indentation(st.output[i]);
                 break;
             }
         }
-        output.push_back(indent + "#             fmt: on");
+        st.output.push_back(indent + "#             fmt: on");
         if (debug) cerr << "block closed" << endl;
     }
 };
 
-PYBIND11_MODULE(_detect_formatted_blocks, m) {
-    m.doc() = "Identifies and marks well-formatted code blocks with fmt: off/on "
-              "markers";
-
+// Identifies and marks well-formatted code blocks with fmt: off/on markers
+void bind_detect_formatted_blocks(py::module_ &m) {
     py::class_<IdentifyFormattedBlocks>(m, "IdentifyFormattedBlocks")
         .def(py::init<>(), "Default constructor which initializes the "
                            "substitution matrix.")
@@ -304,10 +304,13 @@ PYBIND11_MODULE(_detect_formatted_blocks, m) {
              py::arg("line2"), "Compute similarity score between two lines")
         .def("mark_formtted_blocks", &IdentifyFormattedBlocks::mark_formtted_blocks,
              py::arg("code"), py::arg("threshold") = 0.7f,
+             py::call_guard<py::gil_scoped_release>(),
              "Process the input code and mark formatted blocks based on a "
              "similarity threshold.")
         .def("unmark", &IdentifyFormattedBlocks::unmark, py::arg("code"),
-             "remove marks.");
+             py::call_guard<py::gil_scoped_release>(), "remove marks.")
+        .def_readwrite("debug", &IdentifyFormattedBlocks::debug,
+                       "Print scoring details to stderr.");
 
     py::enum_<CharGroup>(m, "CharGroup")
         .value("UPPERCASE", UPPERCASE)
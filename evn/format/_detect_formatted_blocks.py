@@ -0,0 +1,4 @@
+"""alias for the block detector, which now lives in the single evn.format._native extension"""
+from evn.format import CharGroup, IdentifyFormattedBlocks
+
+__all__ = ['CharGroup', 'IdentifyFormattedBlocks']
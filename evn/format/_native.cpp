@@ -0,0 +1,13 @@
+// single extension module for evn.format, so the tokenizer, keyword tables and
+// helpers in _common.hpp are compiled and loaded once
+#include "_common.hpp"
+#include "_detect_formatted_blocks.hpp"
+#include "_token_column_format.hpp"
+
+// no mutable globals or shared per-call state, so safe without the GIL
+PYBIND11_MODULE(_native, m, py::mod_gil_not_used()) {
+    m.doc() = "Native formatting helpers for evn: token column alignment and "
+              "detection of hand-formatted blocks";
+    bind_token_column_format(m);
+    bind_detect_formatted_blocks(m);
+}
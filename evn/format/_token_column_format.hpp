@@ -1,3 +1,4 @@
+#pragma once
 #include "_common.hpp"
 
 // Helper struct to store per–line data.
@@ -197,8 +198,8 @@ class PythonLineTokenizer {
     }
 };
 
-PYBIND11_MODULE(_token_column_format, m) {
-    m.doc() = "A module that wraps PythonLineTokenizer using pybind11";
+// Wraps PythonLineTokenizer and the shared tokenizer helpers
+void bind_token_column_format(py::module_ &m) {
     py::class_<PythonLineTokenizer>(m, "PythonLineTokenizer")
         .def(py::init<>())
         .def("format_tokens", &PythonLineTokenizer::format_tokens,
@@ -217,6 +218,7 @@ PYBIND11_MODULE(_token_column_format, m) {
             "formatted.")
         .def("reformat_buffer", &PythonLineTokenizer::reformat_buffer, py::arg("code"),
              py::arg("add_fmt_tag") = false, py::arg("debug") = false,
+             py::call_guard<py::gil_scoped_release>(),
              "Reformat a code buffer, grouping lines with matching token "
              "patterns and indentation into blocks and aligning them into evn "
              "columns.")
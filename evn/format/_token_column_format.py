@@ -0,0 +1,4 @@
+"""alias for the column aligner, which now lives in the single evn.format._native extension"""
+from evn.format import PythonLineTokenizer, is_oneline_statement, tokenize, tokens_match
+
+__all__ = ['PythonLineTokenizer', 'is_oneline_statement', 'tokenize', 'tokens_match']
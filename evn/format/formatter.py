@@ -1,14 +1,19 @@
+import hashlib
 import re
 import subprocess
 from abc import ABC, abstractmethod
-from typing import Optional
+from time import perf_counter
+from typing import ClassVar, Optional
 from dataclasses import dataclass, field
 from evn.format import IdentifyFormattedBlocks, PythonLineTokenizer
+from evn.dev.timing import timed
 
 @dataclass
 class FormatHistory:
     """Tracks original and formatted code for all files being processed."""
     buffers: dict[str, dict[str, str]] = field(default_factory=dict)
+    degraded: dict[str, dict] = field(default_factory=dict)
+    skipped: dict[str, list[str]] = field(default_factory=dict)
 
     def add(self, filename: str, original_code: str):
         """Initialize a new file in history with its original code."""
@@ -26,16 +31,52 @@ class FormatHistory:
         """Retrieve the formatted code."""
         return self.buffers[filename]["formatted"]
 
+    def degrade(self, filename: str, reason: str, step: str):
+        """Record that a step was skipped for a file because it was over budget."""
+        record = self.degraded.setdefault(filename, dict(reason=reason, skipped=[]))
+        record["skipped"].append(step)
+
+    def skip(self, filename: str, step: str):
+        """Record that a step was skipped for a file because it had nothing to do."""
+        self.skipped.setdefault(filename, []).append(step)
+
+@dataclass
+class FormatBudget:
+    """Per-file limits past which expensive steps are skipped. None means unlimited."""
+    max_bytes: Optional[int] = None
+    max_lines: Optional[int] = None
+    max_seconds: Optional[float] = None
+
+    def check_size(self, code: str) -> Optional[str]:
+        """Return the reason a buffer is too large to format fully, or None."""
+        if self.max_bytes is not None and len(code) > self.max_bytes:
+            return f"{len(code)} bytes > max_bytes={self.max_bytes}"
+        if self.max_lines is not None and (nlines := code.count("\n") + 1) > self.max_lines:
+            return f"{nlines} lines > max_lines={self.max_lines}"
+        return None
+
+    def check_time(self, elapsed: float) -> Optional[str]:
+        """Return the reason a file has run out of time, or None."""
+        if self.max_seconds is not None and elapsed > self.max_seconds:
+            return f"{elapsed:.3f}s > max_seconds={self.max_seconds}"
+        return None
+
 @dataclass
 class FormatStep(ABC):
     """Abstract base class for formatting steps in the processing pipeline."""
     formatter: Optional['CodeFormatter'] = None
+    expensive: ClassVar[bool] = False  # skipped when a file is over its FormatBudget
+    idempotent: ClassVar[bool] = False  # skipped on code this step has already produced
 
     @abstractmethod
     def apply_formatting(self, code: str, history: Optional[FormatHistory] = None) -> str:
         """Apply a transformation to the given code buffer."""
         pass
 
+    def needs_work(self, code: str) -> bool:
+        """Cheap check whether apply_formatting could change code. Must never return a false negative."""
+        return True
+
 @dataclass
 class CodeFormatter:
     """Formats Python files using a configurable pipeline of FormatStep actions."""
@@ -43,11 +84,14 @@ class CodeFormatter:
     history: FormatHistory = field(default_factory=FormatHistory)
     cpp_mark: IdentifyFormattedBlocks = field(default_factory=IdentifyFormattedBlocks)
     cpp_aln: PythonLineTokenizer = field(default_factory=PythonLineTokenizer)
+    budget: FormatBudget = field(default_factory=FormatBudget)
+    fixed_points: set[bytes] = field(default_factory=set)
 
     def __post_init__(self):
         for action in self.actions:
             action.formatter = self
 
+    @timed('CodeFormatter.run')
     def run(self, files: dict[str, str], dryrun=False, debug=False) -> FormatHistory:
         """Process in-memory Python file contents and return formatted buffers."""
 
@@ -58,36 +102,68 @@ class CodeFormatter:
         # Process each file through the pipeline
         for filename in self.history.buffers:
             code = self.history.get_original(filename)
+            start, over_budget = perf_counter(), self.budget.check_size(code)
             if debug: print('*************************************')
             if debug: print(code, '\n************ orig ****************')
             for action in self.actions:
                 if debug: print(action.__class__.__name__, flush=True)
+                if action.expensive:
+                    over_budget = over_budget or self.budget.check_time(perf_counter() - start)
+                    if over_budget:
+                        self.history.degrade(filename, over_budget, action.__class__.__name__)
+                        continue
+                if not action.needs_work(code) or self._is_fixed_point(action, code):
+                    self.history.skip(filename, action.__class__.__name__)
+                    continue
                 if dryrun: print(f"Dry run: {action.__class__.__name__} on {filename}")
-                else: code = action.apply_formatting(code, self.history)
+                else:
+                    with timed(action.__class__.__name__):
+                        code = action.apply_formatting(code, self.history)
+                if action.idempotent and not dryrun:
+                    self.fixed_points.add(self._fixed_point_key(action, code))
                 if debug: print(code, f'\n************ {action.__class__.__name__} ****************')
             self.history.update(filename, code)
 
         return self.history
 
+    def _fixed_point_key(self, action: FormatStep, code: str) -> bytes:
+        key = hashlib.blake2b(code.encode("utf-8", "surrogatepass"), digest_size=16, person=action.__class__.__name__[:16].encode())
+        return key.digest()
+
+    def _is_fixed_point(self, action: FormatStep, code: str) -> bool:
+        """True if an idempotent action already produced this exact code, so rerunning it is a no-op."""
+        return action.idempotent and self._fixed_point_key(action, code) in self.fixed_points
+
 no_format_pattern = re.compile(r"^(\s*)(class|def|for|if|elif|else)\s+?.*: [^#].*")
 
 @dataclass
 class MarkHandFormattedBlocksCpp(FormatStep):
     """Adds `# fmt: off` / `# fmt: on` markers around "human-formatted" constructs"""
+    expensive: ClassVar[bool] = True
 
     def apply_formatting(self, code: str, history: Optional[FormatHistory] = None) -> str:
         return self.formatter.cpp_mark.mark_formtted_blocks(code, 5)
 
+fmt_marker = "#             fmt:"
+re_consecutive_blank_lines = re.compile(r"(?:^|\n)[^\S\n]*\n[^\S\n]*\n")
+
 @dataclass
 class UnmarkCpp(FormatStep):
     """Adds `# fmt: off` / `# fmt: on` markers around "human-formatted" constructs"""
+    idempotent: ClassVar[bool] = True
 
     def apply_formatting(self, code: str, history: Optional[FormatHistory] = None) -> str:
         return self.formatter.cpp_mark.unmark(code)
 
+    def needs_work(self, code: str) -> bool:
+        # unmark also collapses consecutive blank lines and terminates the last line
+        if not code: return False
+        return fmt_marker in code or code[-1] != "\n" or bool(re_consecutive_blank_lines.search(code))
+
 @dataclass
 class AlignTokensCpp(FormatStep):
     """Aligns on tokens in the code buffer."""
+    expensive: ClassVar[bool] = True
 
     def apply_formatting(self, code: str, history: Optional[FormatHistory] = None) -> str:
         return self.formatter.cpp_aln.reformat_buffer(code, add_fmt_tag=True)
@@ -95,6 +171,7 @@ class AlignTokensCpp(FormatStep):
 @dataclass
 class RuffFormat(FormatStep):
     """Runs `ruff format` on the in-memory code buffer."""
+    idempotent: ClassVar[bool] = True
 
     def apply_formatting(self, code: str, history: Optional[FormatHistory] = None) -> str:
         try:
@@ -112,10 +189,15 @@ re_two_blank_lines = re.compile(r"\n\s*\n\s*\n")
 @dataclass
 class RemoveExtraBlankLines(FormatStep):
     """Replaces multiple consecutive blank lines with a single blank line."""
+    idempotent: ClassVar[bool] = True
 
     def apply_formatting(self, code: str, history=None) -> str:
         return re.sub(re_two_blank_lines, "\n\n", code).strip()
 
+    def needs_work(self, code: str) -> bool:
+        if not code: return False
+        return code[0].isspace() or code[-1].isspace() or bool(re_two_blank_lines.search(code))
+
 # def format_files(root_path: Path, dryrun: bool = False):
 #     """Reads files, runs CodeFormatter, and writes formatted content back."""
 #     file_map = {}
@@ -141,12 +223,12 @@ class RemoveExtraBlankLines(FormatStep):
 #             Path(filename).write_text(history["formatted"], encoding="utf-8")
 #             print(f"Formatted: {filename}")
 
-def format_buffer(buf, dryrun: bool = False):
+def format_buffer(buf, dryrun: bool = False, budget: Optional[FormatBudget] = None):
     formatter = CodeFormatter([
         # MarkHandFormattedBlocksCpp(),
         AlignTokensCpp(),
         RuffFormat(),
         UnmarkCpp(),
-    ])
+    ], budget=budget or FormatBudget())
     formatted_history = formatter.run(dict(buffer=buf))
     return formatted_history.buffers["buffer"]["formatted"]
@@ -0,0 +1,119 @@
+import asyncio
+import os
+import sys
+import threading
+import evn
+
+def main():
+    test_capture_stdio_threads()
+    test_capture_stdio_asyncio()
+    test_capture_stdio_nested()
+    test_capture_stdio_global()
+    test_capture_fds()
+    test_capture_fds_ring_buffer()
+    test_trace_prints_aggregate()
+    test_trace_prints_threads()
+
+def test_capture_stdio_threads():
+    barrier, results = threading.Barrier(8), {}
+
+    def work(i):
+        with evn.capture_stdio() as out:
+            barrier.wait()
+            for j in range(100):
+                print(i, j)
+            barrier.wait()
+        results[i] = out.read()
+
+    threads = [threading.Thread(target=work, args=(i, )) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    for i in range(8):
+        assert results[i] == ''.join(f'{i} {j}\n' for j in range(100))
+
+def test_capture_stdio_asyncio():
+
+    async def work(i):
+        with evn.capture_stdio() as out:
+            for j in range(10):
+                print(i, j)
+                await asyncio.sleep(0)
+        return out.read()
+
+    async def run():
+        return await asyncio.gather(*(work(i) for i in range(4)))
+
+    for i, result in enumerate(asyncio.run(run())):
+        assert result == ''.join(f'{i} {j}\n' for j in range(10))
+
+def test_capture_stdio_nested():
+    with evn.capture_stdio() as outer:
+        print('a')
+        with evn.capture_stdio() as inner:
+            print('b', file=sys.stderr)
+            with evn.stdio() as (out, _err):
+                assert out is sys.__stdout__
+        print('c')
+    assert outer.read() == 'a\nc\n'
+    assert inner.read() == 'b\n'
+
+def test_capture_stdio_global():
+    with evn.capture_stdio(local=False) as out:
+        assert sys.stdout is out
+        print('x')
+    assert out.read() == 'x\n'
+
+def test_capture_fds():
+    with evn.capture_fds() as captured:
+        os.write(1, b'native out\n')
+        os.write(2, b'native err\n')
+        os.system('echo from child')
+    assert captured.read() == 'native out\nnative err\nfrom child\n'
+    assert captured.dropped == 0
+
+def test_capture_fds_ring_buffer():
+    with evn.capture_fds(fds=(1, ), maxbytes=1000) as captured:
+        os.system(f'{sys.executable} -c "print(\'x\' * 1000000, end=\'\'); print(\'done\')"')
+    assert len(captured.data) == 1000
+    assert captured.read() == 'x' * 995 + 'done\n'
+    assert captured.dropped == 1000005 - 1000
+
+def noisy(n):
+    for i in range(n):
+        print('noise', i)
+
+def test_trace_prints_aggregate():
+    with evn.capture_stdio() as out:
+        with evn.trace_prints(aggregate=True) as tp:
+            noisy(50)
+            print('once')
+    line = noisy.__code__.co_firstlineno + 2
+    # print writes each argument, separator and end separately
+    assert tp.sites[__file__, line, 'noisy'] == [200, sum(len(f'noise {i}\n') for i in range(50))]
+    assert len(tp.sites) == 2
+    text = out.read()
+    assert text.startswith('noise 0\nnoise 1\n')
+    assert f'{__file__}:{line}:noisy' in text.split('once\n')[1]
+    with evn.capture_stdio() as out:
+        with evn.trace_prints(aggregate=True, sample=4) as tp:
+            noisy(50)
+    assert sum(nwrites for nwrites, _ in tp.sites.values()) == 50
+    assert 'sampled 1/4' in out.read()
+
+def test_trace_prints_threads():
+    with evn.capture_stdio() as out:
+        with evn.trace_prints(aggregate=True) as tp:
+            threads = [threading.Thread(target=noisy, args=(50, )) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    line = noisy.__code__.co_firstlineno + 2
+    assert tp.sites[__file__, line, 'noisy'][0] == 4 * 200
+    assert tp.nwrites == 4 * 200
+    assert 'trace_prints: 800 writes from 1 call sites' in out.read()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import re
+import evn
+
+def main():
+    import tempfile
+    from pathlib import Path
+    test_sample_profile()
+    test_sample_profile_output(Path(tempfile.mkdtemp()))
+    test_sample_profile_native_call()
+    test_track_memory()
+    test_track_memory_formatter(Path(tempfile.mkdtemp()))
+
+def spin(n):
+    total = 0
+    for i in range(n):
+        total += i * i
+    return total
+
+def busy(seconds, mode):
+    import time
+    clock = time.process_time if mode == 'cpu' else time.perf_counter
+    start = clock()
+    while clock() - start < seconds:
+        spin(1000)
+
+def test_sample_profile():
+    for mode in ['cpu', 'wall']:
+        with evn.sample_profile(interval=0.001, mode=mode) as prof:
+            busy(0.1, mode)
+        assert prof.nsamples > 10
+        summary = prof.summary(top=100)
+        assert re.search(r'spin \(test_profiling.py:\d+\)', summary)
+        assert 'busy (test_profiling.py' in summary
+        assert any('busy (test_profiling.py' in line and line.split(';')[-1].startswith('spin')
+                   for line in prof.collapsed().splitlines())
+
+def test_sample_profile_output(tmp_path):
+    with evn.sample_profile(output=tmp_path / 'prof.folded'):
+        busy(0.05, 'cpu')
+    lines = (tmp_path / 'prof.folded').read_text().splitlines()
+    assert lines and all(re.fullmatch(r'.+ \d+', line) for line in lines)
+    with evn.sample_profile(output=tmp_path / 'prof.txt'):
+        busy(0.05, 'cpu')
+    assert 'samples every 1ms of cpu time' in (tmp_path / 'prof.txt').read_text()
+
+def test_sample_profile_native_call():
+    big = 'ab' * 2_000_000
+    with evn.sample_profile(interval=0.001, mode='cpu') as prof:
+        busy(0.02, 'cpu')
+        for _ in range(3):
+            big.replace('a', 'c').count('cb')  # long native calls, one signal each
+    own = {name: n for name, n in [(line.split(';')[-1].rsplit(' ', 1)) for line in prof.collapsed().splitlines()]}
+    native = sum(int(n) for name, n in own.items() if name.startswith('test_sample_profile_native_call'))
+    assert native > 3
+
+def allocate():
+    return [bytearray(10_000) for _ in range(100)]
+
+def test_track_memory():
+    with evn.track_memory(nframes=5) as mem:
+        data = allocate()
+        kept = allocate()
+        del data
+    assert 2_000_000 <= mem.peak < 3_000_000
+    assert 1_000_000 <= mem.size < 1_500_000
+    [stat] = mem.top(1)
+    assert stat.traceback[-1].filename == __file__ and stat.size_diff >= 1_000_000
+    report = mem.report(3, group_by='traceback')
+    assert re.match(r'peak 1\.9MiB, 9\d\d\.\dKiB still allocated', report)
+    assert f'{__file__}:{test_track_memory.__code__.co_firstlineno + 3}' in report
+
+def test_track_memory_formatter(tmp_path):
+    code = ''.join(f'x{i} = [{i}, {i}]\n' for i in range(1000))
+    with evn.track_memory(output=tmp_path / 'mem.txt'):
+        evn.CodeFormatter([evn.AlignTokensCpp()]).run({'big.py': code})
+    assert (tmp_path / 'mem.txt').read_text().startswith('peak ')
+
+if __name__ == '__main__':
+    main()
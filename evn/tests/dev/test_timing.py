@@ -0,0 +1,120 @@
+import json
+import sys
+import threading
+import evn
+
+def main():
+    test_timed_tree()
+    test_timed_threads()
+    test_tree_while_threads_record()
+    test_timed_reports()
+    test_report_inside_open_section()
+    test_formatter_is_timed()
+
+def test_timed_tree():
+    t = evn.Timings()
+
+    @evn.timed(timings=t)
+    def leaf():
+        pass
+
+    for _ in range(3):
+        with evn.timed('outer', t):
+            leaf()
+            with evn.timed('inner', t):
+                leaf()
+    leaf()
+    tree = t.tree()
+    counts = {path: node.count for path, node in tree.walk()}
+    qual = leaf.__qualname__
+    assert counts == {('outer', ): 3, ('outer', qual): 3, ('outer', 'inner'): 3, ('outer', 'inner', qual): 3,
+                      (qual, ): 1}
+    outer = tree.children['outer']
+    assert outer.min <= outer.total / 3 <= outer.max
+    assert outer.self_time >= 0
+
+def test_timed_threads():
+    t = evn.Timings()
+
+    def work():
+        for _ in range(100):
+            with evn.timed('work', t):
+                with evn.timed('step', t):
+                    pass
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    tree = t.tree()
+    assert tree.children['work'].count == 400
+    assert tree.children['work'].children['step'].count == 400
+
+def test_tree_while_threads_record():
+    t, done = evn.Timings(), threading.Event()
+
+    def work():
+        i = 0
+        while not done.is_set():
+            with evn.timed('work', t):
+                for _ in range(50):  # new sections keep being added while tree() merges
+                    with evn.timed(f'step{i % 20000}', t):
+                        i += 1
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often, so they record in the middle of merges
+    for thread in threads:
+        thread.start()
+    try:
+        while len(t.tree().children.get('work', evn.TimingNode('')).children) < 20000:
+            pass  # merge until every section has been added
+    finally:
+        sys.setswitchinterval(interval)
+        done.set()
+        for thread in threads:
+            thread.join()
+    assert len(t.tree().children['work'].children) == 20000
+
+def test_timed_reports():
+    t = evn.Timings()
+    with evn.timed('a', t):
+        with evn.timed('b', t):
+            pass
+    table = t.report()
+    assert table.splitlines()[1].startswith('a ') and table.splitlines()[2].startswith('  b ')
+    [a] = json.loads(t.report('json'))
+    assert (a['name'], a['count'], a['children'][0]['name']) == ('a', 1, 'b')
+    assert [line.split()[0] for line in t.report('collapsed').splitlines()] == ['a', 'a;b']
+    t.clear()
+    assert t.report('collapsed') == ''
+
+def test_report_inside_open_section():
+    t = evn.Timings()
+    with evn.timed('done', t):
+        pass
+    with evn.timed('open', t):
+        with evn.timed('inner', t):
+            pass
+        assert [line.split()[0] for line in t.report().splitlines()[1:]] == ['done']
+        assert [a['name'] for a in json.loads(t.report('json'))] == ['done']
+        assert [line.split()[0] for line in t.report('collapsed').splitlines()] == ['done']
+    assert [line.split()[0] for line in t.report('collapsed').splitlines()] == ['done', 'open', 'open;inner']
+    with evn.timed('open', t):  # open again, with more time in its children than its finished run had
+        with evn.timed('inner', t):
+            pass
+        t.stack()[1][0].children['inner'].total += 1.0
+        assert all(int(line.split()[1]) >= 0 for line in t.report('collapsed').splitlines())
+        assert json.loads(t.report('json'))
+    assert evn.TimingNode('x').to_dict()['min'] is None
+
+def test_formatter_is_timed():
+    evn.timings.clear()
+    evn.format_buffer('x  =  1\n')
+    tree = evn.timings.tree()
+    assert tree.children['CodeFormatter.run'].count == 1
+    assert tree.children['CodeFormatter.run'].children
+
+if __name__ == '__main__':
+    main()
@@ -148,5 +148,11 @@ def test_multiline_is_ignored(ifb):
     #             fmt: on
 """
 
+def test_legacy_module_aliases():
+    from evn.format._detect_formatted_blocks import IdentifyFormattedBlocks
+    from evn.format._token_column_format import PythonLineTokenizer
+    assert IdentifyFormattedBlocks is evn.IdentifyFormattedBlocks
+    assert PythonLineTokenizer is evn.PythonLineTokenizer
+
 if __name__ == "__main__":
     main()
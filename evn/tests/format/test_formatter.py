@@ -1,5 +1,7 @@
 import difflib
+from concurrent.futures import ThreadPoolExecutor
 import pytest
+import evn
 from evn import (MarkHandFormattedBlocksCpp, RuffFormat, CodeFormatter, UnmarkCpp,
                                       AlignTokensCpp)
 
@@ -502,5 +504,47 @@ def test_cpp_align_tokens(testcase):
     err = '\n'.join(difflib.ndiff(expected.splitlines(), formatted.splitlines()))
     assert formatted.strip() == expected.strip(), err
 
+def test_format_budget_skips_expensive_steps():
+    code = 'monkey = [banana, kiwi , apple]\nalpha  = [beta, gamma, delta]\nif x: y\n'
+    formatter = CodeFormatter([AlignTokensCpp(), UnmarkCpp()], budget=evn.FormatBudget(max_lines=3))
+    history = formatter.run({"big.py": code, "small.py": code.splitlines()[0]})
+    assert history.get_formatted("big.py") == code
+    assert history.degraded["big.py"] == dict(reason="4 lines > max_lines=3", skipped=["AlignTokensCpp"])
+    assert "small.py" not in history.degraded
+
+def test_format_budget_time():
+    formatter = CodeFormatter([AlignTokensCpp()], budget=evn.FormatBudget(max_seconds=-1))
+    history = formatter.run({"test_case.py": "a = 1\nbb = 2\n"})
+    assert history.get_formatted("test_case.py") == "a = 1\nbb = 2\n"
+    assert history.degraded["test_case.py"]["skipped"] == ["AlignTokensCpp"]
+
+def test_steps_skipped_when_unnecessary():
+    files = {"clean.py": "a = 1\n\nb = 2", "marked.py": "#             fmt: off\na = 1\n\n\n"}
+    history = CodeFormatter([UnmarkCpp()]).run(files)
+    assert history.skipped == {}
+    history = CodeFormatter([evn.RemoveExtraBlankLines()]).run(files)
+    assert history.skipped == {"clean.py": ["RemoveExtraBlankLines"]}
+    history = CodeFormatter([UnmarkCpp()]).run({"clean.py": "a = 1\n\nb = 2\n"})
+    assert history.skipped == {"clean.py": ["UnmarkCpp"]}
+
+def test_idempotent_steps_skipped_on_own_output():
+    formatter = CodeFormatter([RuffFormat()])
+    formatted = formatter.run({"a.py": "x=1"}).get_formatted("a.py")
+    assert formatter.run({"b.py": formatted}).skipped == {"b.py": ["RuffFormat"]}
+    assert formatter.history.get_formatted("b.py") == formatted
+
+def test_native_formatting_threaded():
+    """shared native formatter objects give the same results when used from many threads at once"""
+    aln, mark = evn.PythonLineTokenizer(), evn.IdentifyFormattedBlocks()
+    bufs = [f'x{i} = [a, b{i}, c]\ny = [aa, bb, {i}]\nif x: y\nprint({i})\n' * (i % 7 + 1) for i in range(64)]
+
+    def fmt(buf):
+        return mark.unmark(mark.mark_formtted_blocks(aln.reformat_buffer(buf, add_fmt_tag=True), 5))
+
+    expected = [fmt(buf) for buf in bufs]
+    with ThreadPoolExecutor(16) as pool:
+        for _ in range(4):
+            assert list(pool.map(fmt, bufs)) == expected
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+import evn
+from evn.tool.duration_history import DurationHistory, DurationRecorder, choose_workers, duration_args
+
+def main():
+    import tempfile
+    from pathlib import Path
+    test_choose_workers()
+    test_history_workers(Path(tempfile.mkdtemp()))
+    test_plugin_records_durations(Path(tempfile.mkdtemp()))
+    test_workers_order_slow_tests_first(Path(tempfile.mkdtemp()))
+    test_dispatch_loads_plugin(Path(tempfile.mkdtemp()))
+
+def test_choose_workers():
+    assert choose_workers([]) == 0
+    assert choose_workers([5.0]) == 0  # one test, nothing to spread
+    assert choose_workers([0.01] * 1000) == 0  # tiny run, xdist startup would dominate
+    assert choose_workers([1.0] * 100, cpus=8) == 8
+    assert choose_workers([1.0] * 3, cpus=8) == 3
+    assert choose_workers([0.5] * 8, cpus=8) == 4  # at least a second of tests per worker
+    assert choose_workers([4.0, 2.0, 2.0, 1.0, 1.0], cpus=8) == 2  # bounded by the longest test
+
+def test_history_workers(tmp_path):
+    history = DurationHistory(tmp_path / 'durations.json')
+    history.update({f'tests/test_slow.py::test_{i}': 1.0 for i in range(4)})
+    history.update({'tests/test_fast.py::test_a': 0.01, 'tests/test_fast.py::test_b': 0.01})
+    assert history.workers(['tests/test_slow.py'], cpus=8) == 4
+    assert history.workers(['./tests/test_fast.py'], cpus=8) == 0
+    assert history.workers(['tests/test_new.py'], cpus=8) == 0
+    assert history.workers(cpus=8) == 4
+    history.save()
+    other = DurationHistory(tmp_path / 'durations.json')
+    other.durations.clear()
+    other.update({'tests/test_other.py::test': 1.0})
+    other.save()  # merged, not overwritten
+    assert len(DurationHistory(tmp_path / 'durations.json').durations) == 7
+
+def test_plugin_records_durations(tmp_path):
+    os.makedirs(tmp_path / 'tests')
+    (tmp_path / 'tests' / 'test_sleep.py').write_text('import time\n'
+                                                      'def test_slow(): time.sleep(0.2)\n'
+                                                      'def test_fast(): pass\n')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.dirname(evn.__file__)))
+    subprocess.run([sys.executable, '-m', 'pytest', '-q', '-p', 'evn.tool.duration_history', 'tests'],
+                   cwd=tmp_path, env=env, check=True, capture_output=True)
+    durations = DurationHistory(tmp_path / '.evn_test_durations.json').durations
+    assert sorted(durations) == ['tests/test_sleep.py::test_fast', 'tests/test_sleep.py::test_slow']
+    assert durations['tests/test_sleep.py::test_slow'] >= 0.2 > durations['tests/test_sleep.py::test_fast']
+
+def test_workers_order_slow_tests_first(tmp_path):
+    history = DurationHistory(tmp_path / '.evn_test_durations.json')
+    history.update({'test_a.py::fast': 0.1, 'test_a.py::slow': 3.0, 'test_b.py::medium': 1.0})
+    history.save()
+    config = SimpleNamespace(invocation_params=SimpleNamespace(dir=tmp_path), rootpath=tmp_path)
+    nodeids = ['test_a.py::fast', 'test_a.py::slow', 'test_b.py::medium', 'test_b.py::new']
+    items = [SimpleNamespace(nodeid=n) for n in nodeids]
+    DurationRecorder(config).pytest_collection_modifyitems(items)
+    assert [i.nodeid for i in items] == nodeids  # in process, collection order is kept
+    config.workerinput = {}
+    DurationRecorder(config).pytest_collection_modifyitems(items)
+    assert [i.nodeid for i in items] == ['test_b.py::new', 'test_a.py::slow', 'test_b.py::medium',
+                                         'test_a.py::fast']
+
+def test_dispatch_loads_plugin(tmp_path):
+    os.makedirs(tmp_path / 'proj' / 'tests')
+    (tmp_path / 'proj' / 'tests' / 'test_a.py').write_text('def test(): pass\n')
+    no_evn = tmp_path / 'python_without_evn'
+    no_evn.write_text(f'#!/bin/sh\nexec {sys.executable} -I "$@"\n')  # -I ignores PYTHONPATH
+    no_evn.chmod(0o755)
+    with evn.cd(tmp_path):
+        assert duration_args(['proj/tests/test_a.py']) == '-p evn.tool.duration_history'  # no history yet
+        assert duration_args(['proj/tests/test_a.py'], python=str(no_evn)) == ''
+        assert 'duration_history' not in evn.dispatch(['proj'], 'proj/tests/test_a.py')[0]  # opt-in
+        cmd, _ = evn.dispatch(['proj'], 'proj/tests/test_a.py', duration_history=True)
+        assert ' -m pytest -p evn.tool.duration_history ' in cmd
+        cmd, _ = evn.dispatch(['proj'], 'proj/tests/test_a.py', duration_history=True, python=str(no_evn))
+        assert 'duration_history' not in cmd and cmd.split()[1:4] == [str(no_evn), '-m', 'pytest']
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import gzip
+import evn
+
+trace = '''Traceback (most recent call last):
+  File "example.py", line {}, in <module>
+    1/0
+ZeroDivisionError: division by zero
+'''
+
+def main():
+    import tempfile
+    from pathlib import Path
+    for test in [test_error_index_incremental, test_error_index_partial_trace, test_error_index_rotated_log,
+                 test_error_index_unrecognized_error]:
+        test(Path(tempfile.mkdtemp()))
+
+def test_error_index_incremental(tmp_path):
+    log, db = tmp_path / 'log.txt', tmp_path / 'errors.sqlite'
+    text = ''.join('noise\n' + trace.format(i % 3) for i in range(10))
+    log.write_text(text[:len(text) // 2])
+    with evn.ErrorIndex(db) as index:
+        index.update(log)
+        with open(log, 'a') as out:
+            out.write(text[len(text) // 2:])
+        assert 0 < index.update(log) < len(text)
+        assert index.update(log) == 0
+        assert index.offset(log) == len(text)
+        assert [t.count for t in index.traces(log)] == [4, 3, 3]
+        assert index.report(log) == evn.analyze_python_errors_log(text)
+    assert evn.analyze_python_errors_log_incremental(log, db) == evn.analyze_python_errors_log(text)
+
+def test_error_index_partial_trace(tmp_path):
+    log = tmp_path / 'log.txt'
+    full = trace.format(1) + 'noise\n' + trace.format(2)
+    cut = len(trace.format(1)) + 6 + 40
+    log.write_text(full[:cut])
+    with evn.ErrorIndex(tmp_path / 'errors.sqlite') as index:
+        index.update(log)
+        assert index.offset(log) == len(trace.format(1)) + 6
+        assert index.malformed(log) == 0
+        with open(log, 'a') as out:
+            out.write(full[cut:])
+        index.update(log)
+        assert index.report(log) == evn.analyze_python_errors_log(full)
+
+def test_error_index_rotated_log(tmp_path):
+    log = tmp_path / 'log.txt'
+    log.write_text(trace.format(1) * 3)
+    with evn.ErrorIndex(tmp_path / 'errors.sqlite') as index:
+        index.update(log)
+        log.write_text(trace.format(2))
+        index.update(log)
+        assert [t.count for t in index.traces(log)] == [1]
+        assert index.report(log) == evn.analyze_python_errors_log(trace.format(2))
+        gz = tmp_path / 'log.txt.gz'
+        with gzip.open(gz, 'wt') as out:
+            out.write(trace.format(3) * 2)
+        index.update(gz)
+        assert index.report(gz) == evn.analyze_python_errors_log(trace.format(3) * 2)
+
+def test_error_index_unrecognized_error(tmp_path):
+    log = tmp_path / 'log.txt'
+    odd = 'Traceback (most recent call last):\n  File "app.py", line 3, in run\n    fail()\nmyapp.Failure: boom\n'
+    chunk = ''.join(odd if i % 100 == 0 else f'noise {i}\n' for i in range(1000))
+    with evn.ErrorIndex(tmp_path / 'errors.sqlite') as index:
+        for i in range(3):
+            with open(log, 'a') as out:
+                out.write(chunk + trace.format(i))
+            assert index.update(log) == len(chunk + trace.format(i))
+            assert index.offset(log) == log.stat().st_size
+        assert index.malformed(log) == 30
+        assert [t.count for t in index.traces(log)] == [1, 1, 1]
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,10 @@
 import difflib
+import json
+import mmap
+import os
+import select
+import subprocess
+import sys
 import pytest
 import evn
 
@@ -28,6 +34,236 @@ def test_filter_python_output_small():
 def test_filter_python_output_error():
     helper_test_filter_python_output(errortext, errorfiltered, preset='boilerplate')
 
+@pytest.mark.parametrize('text', ['smalltext', 'midtext', 'errortext'])
+def test_filter_python_output_lines_matches_serial(text):
+    text = globals()[text]
+    ref = evn.filter_python_output(text, preset='boilerplate', minlines=0, filter_numpy_version_nonsense=False)
+    lines = evn.filter_python_output_lines(text.splitlines(keepends=True), preset='boilerplate', minlines=0)
+    assert ref == ''.join(line + os.linesep for line in lines)
+
+def test_python_output_filter_is_incremental():
+    filt = evn.PythonOutputFilter(preset='boilerplate', minlines=0)
+    lines = smalltext.splitlines()
+    assert filt.feed(lines[0]) == [lines[0]]
+    assert filt.feed(lines[1]) == [lines[1]]
+    assert filt.feed(lines[2]) == []  # frame held until the next one starts
+    emitted = [out for line in lines[3:-1] for out in filt.feed(line)]
+    assert emitted[-1] == 'AssertionError'
+    assert filt.feed(lines[-1]) == [lines[-1]]
+    assert filt.flush() == []
+
+def test_python_output_filter_minlines():
+    filt = evn.PythonOutputFilter(preset='boilerplate', minlines=100)
+    assert [out for line in smalltext.splitlines() for out in filt.feed(line)] == []
+    assert filt.flush() == smalltext.splitlines()
+
+def test_python_output_filter_block_overflow():
+    filt = evn.PythonOutputFilter(re_file=r'click/core\.py', minlines=0, max_block_lines=5)
+    lines = ['Traceback (most recent call last):', '  File "/x/click/core.py", line 1, in invoke', '    a()',
+             '  File "/x/click/core.py", line 2, in invoke'] + [f'    line {i}' for i in range(8)]
+    lines += ['  File "b.py", line 2, in f', '    1/0', 'ZeroDivisionError: division by zero']
+    out = [o for line in lines for o in filt.feed(line)] + filt.flush()
+    assert out == [lines[0], '  invoke ->'] + lines[3:]  # the overflowing matched frame is kept whole
+
+def test_frame_matcher_memoizes():
+    matcher = evn.FrameMatcher(re_file=r'pprint\.py', re_func=r'^main$', maxsize=2)
+    filt = evn.PythonOutputFilter(minlines=0)
+    filt.matcher = matcher
+    out = [line for _ in range(3) for line in midtext.splitlines() for line in filt.feed(line)] + filt.flush()
+    assert not any('pprint.py' in line for line in out)
+    stats = matcher.stats()
+    assert stats['size'] == 2
+    assert stats['hits'] + stats['misses'] == 3 * midtext.count('  File "')
+
+def test_register_preset():
+    evn.register_preset('test_only_icecream', file='icecream')
+    try:
+        result = evn.filter_python_output(midtext, preset='test_only_icecream', minlines=0)
+        assert 'icecream.py' not in result and 'pprint.py' in result
+        assert evn.preset_matcher('test_only_icecream').stats()['misses'] > 0
+    finally:
+        del evn.re_presets['test_only_icecream']
+
+@pytest.mark.parametrize('version', ['2.2.3', '2.3.1'])
+@pytest.mark.parametrize('keep_blank_lines', [False, True])
+def test_numpy_noise_removed(version, keep_blank_lines):
+    text = numpy_noise.replace('2.2.3', version)
+    result = evn.filter_python_output(text, minlines=0, keep_blank_lines=keep_blank_lines)
+    assert 'NumPy' not in result and '_ARRAY_API' not in result
+    assert result.split() == ['before', 'after']
+
+def test_register_noise_signature():
+    evn.register_noise_signature('test_only_spam', [r'spam \d+', 'eggs'], regex=True)
+    try:
+        noise = evn.NoiseFilter()
+        lines = ['spam 1', 'spam 2', 'eggs', 'spam 3']
+        assert [out for line in lines for out in noise.feed(line)] == ['spam 1']
+        assert noise.flush() == ['spam 3']
+    finally:
+        del evn.noise_signatures['test_only_spam']
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_filter_python_output_file(tmp_path, nprocs):
+    text = (midtext + smalltext + errortext) * 5
+    path = tmp_path / 'log.txt'
+    path.write_text(text)
+    ref = evn.filter_python_output(text, preset='boilerplate')
+    assert evn.filter_python_output_file(path, nprocs, chunk_bytes=500, preset='boilerplate') == ref
+    assert evn.filter_python_output_file(path, nprocs, chunk_bytes=1 << 20, preset='boilerplate') == ref
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_filter_python_output_file_boilerplate_only(tmp_path, nprocs):
+    trace = '''Traceback (most recent call last):
+  File "/x/click/core.py", line 1, in invoke
+    a()
+  File "/x/click/core.py", line 2, in invoke
+    b()
+KeyboardInterrupt
+'''
+    text = trace * 20
+    path = tmp_path / 'log.txt'
+    path.write_text(text)
+    ref = evn.filter_python_output(text, preset='boilerplate')
+    assert ref.count('  invoke -> invoke ->') == 20
+    assert evn.filter_python_output_file(path, nprocs, chunk_bytes=300, preset='boilerplate') == ref
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_analyze_python_errors_log_file(tmp_path, nprocs):
+    text = ''.join(f'''noise {i}
+Traceback (most recent call last):
+  File "example.py", line {i % 7}, in <module>
+    1/0
+ZeroDivisionError: division by zero
+''' for i in range(50))
+    path = tmp_path / 'log.txt'
+    path.write_text(text)
+    ref = evn.analyze_python_errors_log(text)
+    assert evn.analyze_python_errors_log_file(path, nprocs, chunk_bytes=500) == ref
+
+@pytest.mark.parametrize('nprocs', [1, 2])
+def test_analyze_python_errors_logs(tmp_path, nprocs):
+    trace = """Traceback (most recent call last):
+  File "example.py", line {}, in <module>
+    1/0
+ZeroDivisionError: division by zero
+"""
+    texts = [''.join(trace.format(i % n) for i in range(10)) for n in (1, 2, 3)]
+    for i, text in enumerate(texts):
+        (tmp_path / f'shard{i}').mkdir()
+        (tmp_path / f'shard{i}' / 'log.txt').write_text(text)
+    collector = evn.collect_python_error_traces_files(tmp_path, nprocs)
+    assert evn.collect_python_error_traces(''.join(texts)).traces.keys() == collector.traces.keys()
+    counts = {loc: (info.count, sorted(info.files.values())) for (loc, _), info in collector.traces.items()}
+    assert counts == {'example.py:0': (19, [4, 5, 10]), 'example.py:1': (8, [3, 5]), 'example.py:2': (3, [3])}
+    report = evn.analyze_python_errors_logs([f'{tmp_path}/shard*/log.txt'], nprocs)
+    assert 'Unique Stack Traces Report (3 unique traces):' in report
+    assert '[8 occurrences in 2 files:' in report
+
+@pytest.mark.parametrize('args', [['-a', '-'], ['-a']])
+def test_analyze_stdin(args):
+    text = ''.join(f'Traceback (most recent call last):\n  File "a.py", line {i % 2}, in f\nKeyError: 1\n'
+                   for i in range(5))
+    env = dict(os.environ, PYTHONPATH=str(evn.projroot))
+    result = subprocess.run([sys.executable, '-m', 'evn.tool', *args], input=text.encode(), env=env,
+                            capture_output=True, check=True)
+    assert 'Unique Stack Traces Report (2 unique traces):' in result.stdout.decode()
+    assert '[3 occurrences in 1 files: - (3)]' in result.stdout.decode()
+
+def test_stream_stdin_is_not_held_back():
+    env = dict(os.environ, PYTHONPATH=str(evn.projroot))
+    proc = subprocess.Popen([sys.executable, '-m', 'evn.tool', '-s', '-f', 'boilerplate', '-'], env=env,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        proc.stdin.write(b'hello\n')
+        proc.stdin.flush()  # stdin stays open, the line must come out before the input ends
+        output = b''
+        while b'hello\n' not in output and select.select([proc.stdout], [], [], 30)[0]:
+            if not (chunk := os.read(proc.stdout.fileno(), 1 << 16)): break
+            output += chunk
+        assert b'hello\n' in output
+    finally:
+        proc.stdin.close()
+        proc.wait()
+
+@pytest.mark.parametrize('preset', ['boilerplate', ''])
+def test_inplace_refuses_undecodable_file(tmp_path, preset):
+    log = tmp_path / 'log.txt'
+    log.write_bytes(b'x  =  1\n\xff\xfe not utf-8\n')
+    env = dict(os.environ, PYTHONPATH=str(evn.projroot))
+    result = subprocess.run([sys.executable, '-m', 'evn.tool', '-i', '-f', preset, str(log)], env=env,
+                            capture_output=True, check=False)
+    assert result.returncode != 0 and b'UnicodeDecodeError' in result.stderr
+    assert log.read_bytes() == b'x  =  1\n\xff\xfe not utf-8\n'
+
+def test_write_errors_log_report(tmp_path):
+    log = midtext + """Traceback (most recent call last):
+  File "example.py", line 10, in <module>
+ValueError: x
+Traceback (most recent call last):
+"""
+    collector = evn.collect_python_error_traces(log)
+    evn.write_errors_log_report(collector.traces, tmp_path / 'report.txt.gz', collector.malformed)
+    with evn.open_log(tmp_path / 'report.txt.gz', 'rt') as inp:
+        assert inp.read() == evn.analyze_python_errors_log(log)
+    with open(tmp_path / 'report.jsonl', 'w') as out:
+        evn.write_errors_log_report(collector.traces, out, collector.malformed, format='jsonl')
+    records = [json.loads(line) for line in open(tmp_path / 'report.jsonl')]
+    assert [r.get('signature') for r in records] == [list(key) for key in collector.traces] + [None]
+    assert records[-2]['count'] == 1 and records[-2]['trace'].endswith('ValueError: x')
+    assert records[-1] == dict(malformed=1)
+
+def test_bytes_python_output_filter():
+    ref = evn.filter_python_output(midtext, preset='boilerplate', minlines=0)
+    lines = midtext.encode().splitlines(keepends=True)
+    result = evn.filter_python_output_lines(lines, preset='boilerplate', minlines=0, engine=evn.BytesPythonOutputFilter)
+    assert ref == ''.join(line + os.linesep for line in result)
+
+def test_log_file_from_mmap(tmp_path):
+    text = (midtext + smalltext) * 3 + """Traceback (most recent call last):
+  File "example.py", line 10, in <module>
+    1/0
+ZeroDivisionError: division by zero
+"""
+    path = tmp_path / 'log.txt'
+    path.write_text(text)
+    with open(path, 'rb') as inp, mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        assert evn.filter_python_output_file(mm, chunk_bytes=500) == evn.filter_python_output(text)
+        tail = len(text) - 120
+        assert evn.collect_python_error_traces(mm, tail).traces.keys() == evn.collect_python_error_traces(
+            text[tail:]).traces.keys()
+    assert evn.filter_python_output_file(path, minlines=1000) == text
+    (tmp_path / 'empty.txt').write_text('')
+    assert evn.filter_python_output_file(tmp_path / 'empty.txt') == ''
+
+@pytest.mark.parametrize('suffix', ['.gz', '.xz', '.bz2'])
+def test_compressed_log_files(tmp_path, suffix):
+    text = ''.join(f"""noise {i}
+Traceback (most recent call last):
+  File "example.py", line {i % 3}, in <module>
+    1/0
+ZeroDivisionError: division by zero
+""" for i in range(20)) + midtext
+    path = tmp_path / f'log.txt{suffix}'
+    with evn.open_log(path, 'wt') as out:
+        out.write(text)
+    assert evn.log_compression(path) is not None
+    (tmp_path / 'misnamed.log').write_bytes(path.read_bytes())
+    assert evn.log_compression(tmp_path / 'misnamed.log') is evn.log_compression(path)
+    assert evn.filter_python_output_file(path) == evn.filter_python_output(text)
+    errlog = text[:text.index('maintest')]
+    with evn.open_log(tmp_path / f'err.txt{suffix}', 'wt') as out:
+        out.write(errlog)
+    ref = evn.analyze_python_errors_log(errlog)
+    assert evn.analyze_python_errors_log_file(tmp_path / f'err.txt{suffix}', chunk_bytes=300) == ref
+
+def test_open_log_closes_on_error(tmp_path):
+    path = tmp_path / 'log.txt.gz'
+    with evn.open_log(path, 'wt') as out:
+        out.write('line\n')
+    with pytest.raises(ValueError), evn.open_log(path, 'rt') as inp:
+        raise ValueError('failed while reading')
+    assert inp.closed and inp.buffer.closed
+
 def test_analyze_python_errors_log():
     log = '''Traceback (most recent call last):
   File "example.py", line 10, in <module>
@@ -99,7 +335,53 @@ ZeroDivisionError: division by zero'''
     assert 'ZeroDivisionError: division by zero' in result
     assert result.count('ZeroDivisionError') == 2
 
+def test_trace_counts_and_offsets():
+    trace = 'Traceback (most recent call last):\n  File "a.py", line 3, in f\n    1/0\nZeroDivisionError: no\n'
+    log = 'x\n' + trace + 'y\n' + trace + trace
+    collector = evn.collect_python_error_traces(log)
+    [info] = collector.traces.values()
+    assert (info.count, info.first, info.last) == (3, 2, 4 + 2 * len(trace))
+    assert info.trace == trace.rstrip()
+    assert '[3 occurrences, first at offset 2, last at offset' in evn.analyze_python_errors_log(log)
+
+def test_malformed_traces_are_counted():
+    log = midtext + """Traceback (most recent call last):
+  File "example.py", line 10, in <module>
+Traceback (most recent call last):
+no frames here
+ValueError: bad
+"""
+    collector = evn.collect_python_error_traces(log)
+    assert collector.malformed == 2
+    assert ('/home/sheffler/rfd/lib/TEST/TEST/tests/sym/test_sym_detect.py:185', 'AssertionError') in collector.traces
+    assert '2 malformed traces skipped' in evn.analyze_python_errors_log(log)
+
+def test_traces_end_without_error_line():
+    collector = evn.TracebackCollector(max_trace_lines=10)
+    frames = ''.join(f'  File "a.py", line {i}, in f\n    f()\n' for i in range(20))
+    log = 'Traceback (most recent call last):\n' + frames + 'ValueError: x\n'
+    log += 'Traceback (most recent call last):\n  File "a.py", line 1, in f\nmyapp.Failure: boom\nnoise\n'
+    for line in log.splitlines(keepends=True):
+        collector.feed(line)
+    assert collector.lines is None and collector.malformed == 2 and not collector.traces
+
 # ######################### test data #######################
+numpy_noise = """before
+
+A module that was compiled using NumPy 1.x cannot be run in
+NumPy 2.2.3 as it may crash. To support both 1.x and 2.x
+versions of NumPy, modules must be compiled with NumPy 2.0.
+Some module may need to rebuild instead e.g. with 'pybind11>=2.12'.
+
+If you are a user of the module, the easiest solution will be to
+downgrade to 'numpy<2' or try to upgrade the affected module.
+We expect that some modules will need time to support NumPy 2.
+
+    from numexpr.interpreter import MAX_THREADS, use_vml, __BLOCK_SIZE1__
+AttributeError: _ARRAY_API not found
+after
+"""
+
 errortext = """maintest /home/sheffler/rfd/lib/TEST/TEST/tests/dev/code/test_filter_python_output.py:
 Traceback (most recent call last):
   File "/home/sheffler/rfd/lib/TEST/TEST/tests/dev/code/test_filter_python_output.py", line 151, in <module>
@@ -0,0 +1,106 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import pytest
+import evn
+from evn.tool import fork_server
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='fork server needs fork and unix sockets')
+
+def main():
+    import tempfile
+    from pathlib import Path
+    test_fork_server(Path(tempfile.mkdtemp()))
+    test_server_survives_bad_clients(Path(tempfile.mkdtemp()))
+    test_default_address_is_private(Path(tempfile.mkdtemp()))
+    test_peer_uid()
+
+def start_server(address, preload='', pythonpath=()):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(evn.projroot), *map(str, pythonpath)]))
+    proc = subprocess.Popen([sys.executable, '-m', 'evn.tool.fork_server', '--address', address, '--preload',
+                             preload], env=env, stdout=subprocess.DEVNULL)
+    for _ in range(200):
+        if os.path.exists(address): return proc
+        time.sleep(0.05)
+    proc.kill()
+    raise TimeoutError('fork server did not start')
+
+def run(argv, address, **kw):
+    out = io.BytesIO()
+    code = fork_server.run_in_server(argv, address=address, out=out, **kw)
+    return code, out.getvalue().decode()
+
+def test_fork_server(tmp_path):
+    address = str(tmp_path / 'server.sock')
+    assert run(['-c', 'pass'], address) == (None, '')
+    (tmp_path / 'preloaded.py').write_text('value = 1\n')
+    proc = start_server(address, preload='json,preloaded', pythonpath=[tmp_path])
+    try:
+        script = tmp_path / 'script.py'
+        script.write_text('import sys\nprint("out", sys.argv[1:])\nprint("err", file=sys.stderr)\nsys.exit(3)\n')
+        assert run([str(script), 'a', 'b'], address) == (3, "out ['a', 'b']\nerr\n")
+        code, output = run(['-c', 'import json, os; print(os.getcwd(), os.environ["FOO"])'], address,
+                           env=dict(FOO='bar'), cwd=str(tmp_path))
+        assert (code, output) == (0, f'{tmp_path} bar\n')
+        (tmp_path / 'test_x.py').write_text('def test_a(): pass\ndef test_b(): assert 0\n')
+        code, output = run(['-m', 'pytest', '-q', '-p', 'no:cacheprovider', 'test_x.py'], address, cwd=str(tmp_path))
+        assert code == 1 and '1 failed, 1 passed' in output
+        assert run(['-c', 'raise ValueError("boom")'], address)[1].rstrip().endswith('ValueError: boom')
+        cmd = f'FOO=x {sys.executable} -mpytest -q -p no:cacheprovider {tmp_path}/test_x.py -k test_a'
+        assert evn.run_cmd_in_server(cmd, address) == 0
+        assert evn.run_cmd_in_server(f'ls {tmp_path}', address) is None
+        (tmp_path / 'preloaded.py').write_text('value = 2\n')
+        assert run(['-c', 'pass'], address) == (None, '')  # stale preloaded module, server restarts
+        for _ in range(200):
+            code, output = run(['-c', 'import preloaded; print(preloaded.value)'], address)
+            if code is not None: break
+            time.sleep(0.05)
+        assert (code, output) == (0, '2\n')
+    finally:
+        proc.kill()
+        proc.wait()
+
+def test_server_survives_bad_clients(tmp_path):
+    address = str(tmp_path / 'server.sock')
+    proc = start_server(address)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(address)
+            conn.sendall(b'not json\n')
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.connect(address)
+            request = dict(argv=['-c', 'import time; time.sleep(0.5); print("x" * 100000)'], env=dict(os.environ),
+                           cwd=str(tmp_path))
+            conn.sendall(json.dumps(request).encode() + b'\n')
+            conn.recv(1)  # hang up before the output and exit code are sent
+        assert run(['-c', 'print("still serving")'], address) == (0, 'still serving\n')
+        assert proc.poll() is None
+    finally:
+        proc.kill()
+        proc.wait()
+
+def test_default_address_is_private(tmp_path):
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    try:
+        os.environ['XDG_RUNTIME_DIR'] = str(tmp_path)
+        assert fork_server.default_address() == str(tmp_path / 'evn-fork-server.sock')
+        os.chmod(tmp_path, 0o777)  # anyone could bind the socket first
+        address = fork_server.default_address()
+        assert not address.startswith(str(tmp_path))
+        assert os.stat(os.path.dirname(address)).st_mode & 0o777 == 0o700
+    finally:
+        if runtime_dir is None: del os.environ['XDG_RUNTIME_DIR']
+        else: os.environ['XDG_RUNTIME_DIR'] = runtime_dir
+
+def test_peer_uid():
+    a, b = socket.socketpair()
+    with a, b:
+        assert fork_server._peer_uid(a) in (None, os.getuid())
+        assert fork_server._same_user(a)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import os
+import sys
+import evn
+from evn.tool.project_index import ProjectIndex
+
+def main():
+    import tempfile
+    from pathlib import Path
+    test_project_index(Path(tempfile.mkdtemp()))
+    test_dispatch_with_index(Path(tempfile.mkdtemp()))
+    test_affected_tests(Path(tempfile.mkdtemp()))
+    test_dispatch_affected(Path(tempfile.mkdtemp()))
+
+def test_project_index(tmp_path):
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'a.py').write_text('x = 1\n')
+    index = ProjectIndex(tmp_path).scan()
+    assert index.exists(tmp_path / 'pkg' / 'a.py')
+    assert not index.exists(tmp_path / 'pkg' / 'b.py')
+    assert not index.exists(tmp_path / 'nodir' / 'b.py')
+    assert not index.has_main(tmp_path / 'pkg' / 'a.py')
+    index.save()
+    assert not index.dirty
+
+    index = ProjectIndex(tmp_path)
+    assert not index.has_main(tmp_path / 'pkg' / 'a.py') and not index.dirty  # served from disk
+    (tmp_path / 'pkg' / 'a.py').write_text("if __name__ == '__main__':\n    pass\n")
+    os.utime(tmp_path / 'pkg' / 'a.py', (0, 1))
+    (tmp_path / 'pkg' / 'b.py').write_text('')
+    os.utime(tmp_path / 'pkg', (0, 1))
+    assert index.has_main(tmp_path / 'pkg' / 'a.py')
+    assert index.exists(tmp_path / 'pkg' / 'b.py')
+    assert index.dirty
+
+def test_dispatch_with_index(tmp_path):
+    os.makedirs(tmp_path / 'proj' / 'tests' / 'sub')
+    os.makedirs(tmp_path / 'proj' / 'sub')
+    (tmp_path / 'proj' / 'sub' / 'mod.py').write_text('x = 1\n')
+    (tmp_path / 'proj' / 'tests' / 'sub' / 'test_mod.py').write_text('def test(): pass\n')
+    (tmp_path / 'proj' / 'script.py').write_text("if __name__ == '__main__':\n    pass\n")
+    with evn.cd(tmp_path):
+        index = ProjectIndex()
+        for fname in ['proj/sub/mod.py', 'proj/script.py', 'proj/tests/sub/test_mod.py']:
+            assert evn.dispatch(['proj'], fname, index=index) == evn.dispatch(['proj'], fname)
+        cmd, _ = evn.dispatch(['proj'], 'proj/sub/mod.py', index=index)
+        assert cmd.endswith(f'{sys.executable} -m pytest -x --disable-warnings -m "not nondeterministic" '
+                            '--doctest-modules --durations=7 proj/sub/mod.py proj/tests/sub/test_mod.py')
+
+def test_affected_tests(tmp_path):
+    os.makedirs(tmp_path / 'pkg' / 'sub')
+    os.makedirs(tmp_path / 'tests')
+    (tmp_path / 'pkg' / '__init__.py').write_text('')
+    (tmp_path / 'pkg' / 'sub' / '__init__.py').write_text('from .b import f\n')
+    (tmp_path / 'pkg' / 'a.py').write_text('x = 1\n')
+    (tmp_path / 'pkg' / 'sub' / 'b.py').write_text('from ..a import x\ndef f(): return x\n')
+    (tmp_path / 'pkg' / 'c.py').write_text('y = 2\n')
+    (tmp_path / 'tests' / 'test_b.py').write_text('from pkg.sub import f\n')
+    (tmp_path / 'tests' / 'test_c.py').write_text('import pkg.c\n')
+    (tmp_path / 'tests' / 'test_broken.py').write_text('import pkg.a\ndef (:\n')
+    index = ProjectIndex(tmp_path)
+    assert index.module_name(tmp_path / 'pkg' / 'sub' / 'b.py') == 'pkg.sub.b'
+    assert index.module_name(tmp_path / 'pkg' / 'sub' / '__init__.py') == 'pkg.sub'
+    assert 'pkg.a' in index.imports(tmp_path / 'pkg' / 'sub' / 'b.py')
+    affected = lambda f: [os.path.basename(t) for t in index.affected_tests(tmp_path / 'pkg' / f)]
+    assert affected('a.py') == ['test_b.py']  # via pkg.sub.b and pkg.sub
+    assert affected('c.py') == ['test_c.py']
+    assert affected('sub/b.py') == ['test_b.py']
+    index.save()
+
+    index = ProjectIndex(tmp_path)
+    assert affected('a.py') == ['test_b.py'] and not index.dirty  # served from disk
+    (tmp_path / 'tests' / 'test_c.py').write_text('import pkg.c\nfrom pkg import a\n')
+    os.utime(tmp_path / 'tests' / 'test_c.py', (0, 1))
+    assert affected('a.py') == ['test_b.py', 'test_c.py']
+    assert list(index.files['tests/test_c.py']) == ['mtime', 'imports']  # only the changed file was parsed
+
+def test_dispatch_affected(tmp_path):
+    os.makedirs(tmp_path / 'proj' / 'tests')
+    (tmp_path / 'proj' / '__init__.py').write_text('')
+    (tmp_path / 'proj' / 'a.py').write_text('x = 1\n')
+    (tmp_path / 'proj' / 'b.py').write_text('from proj.a import x\n')
+    (tmp_path / 'proj' / 'tests' / 'test_b.py').write_text('import proj.b\n')
+    (tmp_path / 'proj' / 'tests' / 'test_z.py').write_text('import proj.b\n')
+    (tmp_path / 'proj' / 'lonely.py').write_text('')
+    (tmp_path / 'proj' / 'tests' / 'test_lonely.py').write_text('def test(): pass\n')  # imports nothing
+    with evn.cd(tmp_path):
+        cmd, _ = evn.dispatch(['proj'], 'proj/a.py', affected=True)
+        assert cmd.endswith('--durations=7 proj/a.py proj/tests/test_b.py proj/tests/test_z.py')
+        cmd, _ = evn.dispatch(['proj'], 'proj/lonely.py', affected=True, index=ProjectIndex())
+        assert cmd.endswith('--durations=7 proj/lonely.py proj/tests/test_lonely.py')
+
+if __name__ == '__main__':
+    main()
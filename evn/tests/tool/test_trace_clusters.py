@@ -0,0 +1,55 @@
+import evn
+
+def main():
+    test_normalize_trace()
+    test_cluster_traces_near_duplicates()
+    test_cluster_traces_many()
+    test_analyze_python_errors_log_clusters()
+
+def make_trace(frames, error, line=1):
+    lines = ['Traceback (most recent call last):']
+    for i, (file, func) in enumerate(frames):
+        lines += [f'  File "{file}", line {line + i}, in {func}', '    do_something()']
+    return '\n'.join(lines + [error])
+
+frames = [('/code/app.py', 'main'), ('/code/app.py', 'run'), ('/code/jobs.py', 'step')]
+frames += [('/code/lib.py', f'helper{i}') for i in range(8)]
+
+def test_normalize_trace():
+    a = make_trace(frames, 'KeyError: <Job object at 0x7f00aa> in /tmp/pytest-12/run3/x.json', line=10)
+    b = make_trace(frames, 'KeyError: <Job object at 0x7f00bb> in /tmp/pytest-13/run3/x.json', line=20)
+    assert a != b
+    assert evn.normalize_trace(a) == evn.normalize_trace(b)
+    assert evn.normalize_trace('ValueError: expected 3 got 4.5e-3') == 'ValueError: expected N got N'
+    assert evn.normalize_trace('  File "numpy2.py"') == '  File "numpy2.py"'
+
+def test_cluster_traces_near_duplicates():
+    traces = {
+        'a': make_trace(frames, 'KeyError: 1'),
+        'b': make_trace(frames[:-1] + [('/code/lib.py', 'other')], 'KeyError: 2'),
+        'c': make_trace(frames, 'KeyError: 3', line=50),
+        'd': make_trace(frames[:3], 'ValueError: bad'),
+    }
+    clusters = evn.cluster_traces(traces)
+    assert [sorted(c.members) for c in clusters] == [['a', 'b', 'c'], ['d']]
+    assert clusters[0].trace == traces['a']
+
+def test_cluster_traces_many():
+    traces = {}
+    for i in range(2000):
+        bug = i % 10
+        stack = frames[:3] + [(f'/code/mod{bug}.py', f'func{j}') for j in range(6)]
+        traces[i] = evn.TraceInfo(make_trace(stack, f'RuntimeError: bug {bug} at 0x{i:x}', line=i), count=2)
+    clusters = evn.cluster_traces(traces)
+    assert len(clusters) == 10
+    assert sum(c.count for c in clusters) == 4000
+
+def test_analyze_python_errors_log_clusters():
+    log = '\n'.join(make_trace(frames, f'ZeroDivisionError: {i}', line=i) for i in range(5))
+    assert 'Unique Stack Traces Report (5 unique traces)' in evn.analyze_python_errors_log(log)
+    report = evn.analyze_python_errors_log_clusters(log)
+    assert 'Clustered Stack Traces Report (1 clusters)' in report
+    assert '[5 occurrences of 5 distinct traces]' in report
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,5 @@
+from evn.tool.log_io import *
 from evn.tool.filter_python_output import *
+from evn.tool.error_index import *
+from evn.tool.trace_clusters import *
 from evn.tool.run_tests_on_file import *
@@ -5,28 +5,57 @@ import evn as evn
 def get_args(sysargv):
     """get command line arguments"""
     parser = argparse.ArgumentParser()
-    parser.add_argument('input', type=str, nargs='+', default='')
+    parser.add_argument('input', type=str, nargs='*', default=['-'], help="files, '-' or nothing for stdin")
     parser.add_argument('-f', '--filter', default='boilerplate', choices=['', 'boilerplate'])
     parser.add_argument('-i', '--inplace', action='store_true')
+    parser.add_argument('-s', '--stream', action='store_true', help='filter stdin line by line as it arrives')
+    parser.add_argument('-o', '--output', default='', help='write here instead of stdout, compressed if .gz/.xz/.bz2')
+    parser.add_argument('-a', '--analyze', action='store_true',
+                        help='one report of the unique tracebacks in all inputs (files, directories or globs)')
+    parser.add_argument('-j', '--nprocs', type=int, default=None, help='worker processes')
+    parser.add_argument('--format', default='text', choices=['text', 'jsonl'], help='--analyze report format')
+    parser.add_argument('--profile', default='',
+                        help='sample this run and write a profile summary here, or collapsed stacks if .folded')
+    parser.add_argument('--track-memory', default='', help='write the peak and top allocation sites here')
     args = parser.parse_args(sysargv[1:])
     return args
 
 def main():
     """Main function to execute the evn module."""
     args = get_args(sys.argv)
-    for input_file in args.input:
-        if input_file == '-':
-            text = sys.stdin.read()
-            args.inplace = False
-        else:
-            with open(input_file, 'r') as inp:    text = inp . read()
-        if args.filter:
-            output = evn.filter_python_output(text, preset=args.filter)
-        else:
-            output = evn.format_buffer(text)
-        ctx = open(input_file, 'w') if args.inplace else evn.just_stdout()
-        with ctx as out:
-            out.write(output)
+    with evn.sample_profile(output=args.profile) if args.profile else evn.nocontext():
+        with evn.track_memory(output=args.track_memory) if args.track_memory else evn.nocontext():
+            run(args)
+
+def run(args):
+    with evn.open_log(args.output, 'wt') if args.output else evn.just_stdout() as out:
+        if args.analyze:
+            collector = evn.collect_python_error_traces_files(args.input, args.nprocs)
+            evn.write_errors_log_report(collector.traces, out, collector.malformed, format=args.format)
+            return
+        for input_file in args.input:
+            if input_file == '-':
+                args.inplace = False
+            if input_file == '-' and args.stream and args.filter:
+                with evn.open_log('-') as inp:
+                    lines = evn.filter_python_output_lines(inp, preset=args.filter, minlines=0,
+                                                           engine=evn.BytesPythonOutputFilter)
+                    for line in lines:
+                        out.write(line + '\n')
+                        out.flush()
+                continue
+            if args.filter and input_file != '-' and not args.inplace:
+                output = evn.filter_python_output_file(input_file, nprocs=args.nprocs, preset=args.filter)
+            else:
+                # a file rewritten in place must decode cleanly, replacement characters would corrupt it
+                with evn.open_log(input_file, 'rt', errors='strict' if args.inplace else 'replace') as inp:
+                    text = inp.read()
+                output = evn.filter_python_output(text, preset=args.filter) if args.filter else evn.format_buffer(text)
+            if args.inplace:
+                with evn.open_log(input_file, 'wt') as inplace:
+                    inplace.write(output)
+            else:
+                out.write(output)
 
 if __name__ == '__main__':
     main()
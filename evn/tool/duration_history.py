@@ -0,0 +1,146 @@
+"""
+per-test duration history for run_tests_on_file
+
+Loaded into pytest with `-p evn.tool.duration_history` (run_tests_on_file --duration_history), this plugin
+records how long each test took in .evn_test_durations.json, in the directory pytest was run from.
+dispatch reads the history back to decide
+whether a run is worth spreading over pytest-xdist workers, and how many: xdist costs a second or more to
+start its workers, more than a handful of quick tests take to run. Under xdist, the workers order their
+tests slowest first so the long ones don't start last and leave the other workers idle.
+"""
+
+import functools
+import importlib.util
+import json
+import math
+import os
+import subprocess
+import sys
+
+class DurationHistory:
+    """
+    Seconds per test node id, with paths relative to the directory of the history file.
+
+    Example:
+        >>> import tempfile
+        >>> history = DurationHistory(os.path.join(tempfile.mkdtemp(), 'durations.json'))
+        >>> history.update({'tests/test_a.py::test_x': 3.0, 'tests/test_a.py::test_y': 1.0})
+        >>> history.update({'tests/test_a.py::test_x': 1.0})
+        >>> history.save()
+        >>> DurationHistory(history.path).of_files(['tests/test_a.py'])
+        [2.0, 1.0]
+    """
+
+    def __init__(self, path='.evn_test_durations.json'):
+        self.path, self.durations = path, {}
+        try:
+            with open(path) as inp:
+                self.durations = json.load(inp)
+        except (OSError, ValueError):
+            pass
+
+    def update(self, durations):
+        """Record new durations, averaged with the previous one of each test to smooth out noisy runs."""
+        for nodeid, seconds in durations.items():
+            old = self.durations.get(nodeid)
+            self.durations[nodeid] = seconds if old is None else (old + seconds) / 2
+
+    def of_files(self, fnames=()):
+        """Durations of the known tests in fnames (relative paths), or of all known tests if fnames is empty."""
+        fnames = {os.path.normpath(f) for f in fnames}
+        return [t for nodeid, t in self.durations.items() if not fnames or nodeid.split('::')[0] in fnames]
+
+    def workers(self, fnames=(), min_total=2.0, per_worker=1.0, cpus=None):
+        """pytest-xdist workers worth using to run fnames, 0 to run them in process. See choose_workers."""
+        return choose_workers(self.of_files(fnames), min_total, per_worker, cpus)
+
+    def save(self):
+        """Merge into the history file, written atomically so concurrent runs never see a partial file."""
+        durations = DurationHistory(self.path).durations
+        durations.update(self.durations)
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as out:
+            json.dump(durations, out, indent=0)
+        os.replace(tmp, self.path)
+
+def choose_workers(durations, min_total=2.0, per_worker=1.0, cpus=None):
+    """
+    Number of pytest-xdist workers for tests with these durations, or 0 to run them in process: the run
+    must take at least min_total seconds, and each worker gets at least per_worker seconds of tests and no
+    less than the longest test.
+
+    Example:
+        >>> choose_workers([0.1] * 10), choose_workers([1.0] * 10, cpus=4)
+        (0, 4)
+        >>> choose_workers([6.0, 1.0, 1.0], cpus=4)  # the 6s test takes as long as the rest run serially
+        0
+    """
+    durations = list(durations)
+    total = sum(durations)
+    if len(durations) < 2 or total < min_total: return 0
+    cpus = cpus or os.cpu_count() or 1
+    n = min(cpus, len(durations), math.floor(total / per_worker), math.floor(total / max(durations)))
+    return n if n > 1 else 0
+
+def duration_args(fnames=(), python=None, pythonpath=None, path='.evn_test_durations.json'):
+    """
+    Arguments that load this plugin into pytest and, if xdist is installed and pays off, add -n workers.
+    Both are checked in the python that will run pytest, with that PYTHONPATH; '' if it can't import evn.
+    """
+    found = importable(python or sys.executable, ('evn.tool.duration_history', 'xdist'), pythonpath)
+    if 'evn.tool.duration_history' not in found: return ''
+    args = '-p evn.tool.duration_history'
+    if 'xdist' in found and (n := DurationHistory(path).workers(fnames)):
+        args += f' -n {n}'
+    return args
+
+@functools.lru_cache
+def importable(python, modules, pythonpath=None):
+    """The modules (a tuple) that python can import, with PYTHONPATH set to pythonpath if given."""
+    if python == sys.executable and pythonpath is None:
+        return {m for m in modules if _find_spec(m)}
+    env = dict(os.environ) if pythonpath is None else dict(os.environ, PYTHONPATH=pythonpath)
+    code = f'import importlib.util as u\nfor m in {list(modules)!r}:\n' \
+           '    try: u.find_spec(m) and print(m)\n    except ImportError: pass'
+    try:
+        found = subprocess.run([python, '-c', code], env=env, capture_output=True, text=True, timeout=60,
+                               check=False).stdout
+    except (OSError, subprocess.SubprocessError):
+        return set()
+    return set(found.split()) & set(modules)
+
+def _find_spec(module):
+    try:
+        return importlib.util.find_spec(module)
+    except ImportError:  # parent package missing
+        return None
+
+class DurationRecorder:
+    """pytest plugin: records test durations in the controller, orders tests slowest first in xdist workers."""
+
+    def __init__(self, config, path='.evn_test_durations.json'):
+        self.dir, self.root = str(config.invocation_params.dir), str(config.rootpath)
+        self.history = DurationHistory(os.path.join(self.dir, path))
+        self.worker = hasattr(config, 'workerinput')
+        self.times = {}
+
+    def key(self, nodeid):
+        fname, sep, rest = nodeid.partition('::')
+        return os.path.relpath(os.path.join(self.root, fname), self.dir) + sep + rest
+
+    def pytest_collection_modifyitems(self, items):
+        # xdist hands out tests in the order its workers collected them
+        if self.worker: items.sort(key=lambda item: -self.history.durations.get(self.key(item.nodeid), math.inf))
+
+    def pytest_runtest_logreport(self, report):
+        if not self.worker and not getattr(report, 'skipped', False):
+            key = self.key(report.nodeid)
+            self.times[key] = self.times.get(key, 0.0) + report.duration
+
+    def pytest_sessionfinish(self):
+        if self.worker or not self.times: return
+        self.history.update(self.times)
+        self.history.save()
+
+def pytest_configure(config):
+    config.pluginmanager.register(DurationRecorder(config), 'evn_duration_recorder')
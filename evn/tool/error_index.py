@@ -0,0 +1,133 @@
+"""
+persistent, incremental index of the unique tracebacks in log files
+
+Services keep appending to the same log, so re-analyzing the whole file every few minutes is mostly wasted
+work. ErrorIndex keeps the trace signatures, counts and the byte offset scanned so far in a small SQLite file,
+and each update only reads what was appended since. A trace still being written when the update runs is
+left for the next one. If a log is truncated or replaced (rotated), its entries are dropped and it is
+scanned from the start.
+"""
+
+import os
+import sqlite3
+from evn.tool.log_io import log_compression, open_log
+from evn.tool.filter_python_output import TraceInfo, TracebackCollector, create_errors_log_report
+
+_schema = """
+create table if not exists logs (
+    path text primary key, offset integer not null, head blob not null, malformed integer not null
+);
+create table if not exists traces (
+    path text not null, location text not null, error text not null, trace text not null,
+    count integer not null, first integer not null, last integer not null,
+    primary key (path, location, error)
+);
+"""
+_head_bytes = 256
+
+class ErrorIndex:
+    """Unique traceback signatures of one or more log files, stored in a SQLite file and updated incrementally.
+
+    Example:
+        >>> import tempfile
+        >>> tmp = tempfile.mkdtemp()
+        >>> log = os.path.join(tmp, 'log.txt')
+        >>> trace = 'Traceback (most recent call last):\\n  File "a.py", line 1, in f\\nValueError: x\\n'
+        >>> with open(log, 'w') as out: _ = out.write(trace)
+        >>> with ErrorIndex(os.path.join(tmp, 'errors.sqlite')) as index:
+        ...     index.update(log)
+        ...     with open(log, 'a') as out: _ = out.write('noise\\n' + trace)
+        ...     index.update(log)
+        ...     index.traces(log)[0].count
+        77
+        83
+        2
+    """
+
+    def __init__(self, path='.evn_errors.sqlite'):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def offset(self, log):
+        """Bytes of log already scanned, 0 if it has not been indexed."""
+        row = self.db.execute('select offset from logs where path = ?', (_key(log), )).fetchone()
+        return row[0] if row else 0
+
+    def update(self, log):
+        """Scan the part of log appended since the last update and fold its traces into the index.
+
+        Returns:
+            int: the number of bytes scanned
+        """
+        key = _key(log)
+        with open_log(log) as inp:
+            head = inp.read(_head_bytes)
+            row = self.db.execute('select offset, head, malformed from logs where path = ?', (key, )).fetchone()
+            offset, malformed = (row[0], row[2]) if row else (0, 0)
+            if row and (not head.startswith(row[1]) or _shrunk(log, offset)):
+                self.forget(log)
+                offset, malformed = 0, 0
+            inp.seek(offset)
+            collector = TracebackCollector(offset=offset)
+            for line in inp:
+                if not line.endswith(b'\n'): break  # partial line, still being written
+                collector.feed(line)
+        end = collector.offset if collector.lines is None else collector.start
+        with self.db:
+            self.db.execute('insert or replace into logs values (?, ?, ?, ?)',
+                            (key, end, head, malformed + collector.malformed))
+            for (location, error), info in collector.traces.items():
+                self.db.execute(
+                    """insert into traces values (?, ?, ?, ?, ?, ?, ?)
+                       on conflict (path, location, error) do update set
+                       count = count + excluded.count, last = max(last, excluded.last)""",
+                    (key, location, error, info.trace, info.count, info.first, info.last))
+        return end - offset
+
+    def forget(self, log):
+        """Drop everything indexed for log."""
+        key = _key(log)
+        with self.db:
+            self.db.execute('delete from logs where path = ?', (key, ))
+            self.db.execute('delete from traces where path = ?', (key, ))
+
+    def traces(self, log):
+        """The TraceInfo of each unique signature in log, in order of first occurrence."""
+        rows = self.db.execute('select trace, count, first, last from traces where path = ? order by first',
+                               (_key(log), ))
+        return [TraceInfo(*row) for row in rows]
+
+    def malformed(self, log):
+        row = self.db.execute('select malformed from logs where path = ?', (_key(log), )).fetchone()
+        return row[0] if row else 0
+
+    def report(self, log):
+        """Report of the unique traces in log, like analyze_python_errors_log."""
+        rows = self.db.execute('select location, error, trace, count, first, last from traces where path = ? '
+                               'order by first', (_key(log), ))
+        trace_map = {(loc, err): TraceInfo(*rest) for loc, err, *rest in rows}
+        return create_errors_log_report(trace_map, self.malformed(log))
+
+def analyze_python_errors_log_incremental(log, index='.evn_errors.sqlite'):
+    """Update the index (an ErrorIndex or the path of its SQLite file) with log and return its report."""
+    if isinstance(index, ErrorIndex):
+        index.update(log)
+        return index.report(log)
+    with ErrorIndex(index) as error_index:
+        return analyze_python_errors_log_incremental(log, error_index)
+
+def _key(log):
+    return os.path.abspath(log)
+
+def _shrunk(log, offset):
+    return not log_compression(log) and os.path.getsize(log) < offset
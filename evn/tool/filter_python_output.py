@@ -1,10 +1,18 @@
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import glob
+import contextlib
+import io
+import json
+import mmap
 import os
 import re
-import evn
+from evn.tool.log_io import log_compression, open_log
 
 re_block = re.compile(r'  File "([^"]+)", line (\d+), in (.*)')
 re_end = re.compile(r'(^[A-Za-z0-9.]+Error)(: .*)?')
+re_traceback = re.compile(r'Traceback \(most recent call last\):')
+traceback_header = b'\nTraceback (most recent call last):'
 re_null = r'a^'  # never matches
 re_presets = dict(boilerplate=dict(
     file=
@@ -13,6 +21,65 @@ re_presets = dict(boilerplate=dict(
     r'<module>|main|call_with_args_from|wrapper|print_table|make_table|import_module|import_optional_dependency|kwcall',
 ))
 
+class FrameMatcher:
+    """Decides which traceback frames match the file / func patterns, memoizing per (file, func).
+
+    Long logs repeat the same few hundred frames many times, so most lookups are dict hits instead of
+    regex searches over the big preset alternations. The cache holds at most maxsize entries, evicting
+    the oldest first.
+
+    Example:
+        >>> matcher = FrameMatcher(r'click/core.py', r'main')
+        >>> matcher.match('/a/click/core.py', 'invoke'), matcher.match('/a/click/core.py', 'invoke')
+        ((True, False), (True, False))
+        >>> matcher.stats()
+        {'hits': 1, 'misses': 1, 'size': 1, 'hit_rate': 0.5}
+    """
+
+    def __init__(self, re_file=re_null, re_func=re_null, maxsize=65536):
+        self.re_file = re.compile(re_file) if isinstance(re_file, str) else re_file
+        self.re_func = re.compile(re_func) if isinstance(re_func, str) else re_func
+        self.maxsize = maxsize
+        self.cache = {}
+        self.hits, self.misses = 0, 0
+
+    def match(self, file, func):
+        """Return (file matches, func matches) for a frame."""
+        key = (file, func)
+        if (found := self.cache.get(key)) is not None:
+            self.hits += 1
+            return found
+        self.misses += 1
+        found = bool(self.re_file.search(file)), bool(self.re_func.search(func))
+        if len(self.cache) >= self.maxsize:
+            self.cache.pop(next(iter(self.cache)), None)
+        self.cache[key] = found
+        return found
+
+    def stats(self):
+        """Cache hit/miss counts and hit rate."""
+        total = self.hits + self.misses
+        return dict(hits=self.hits, misses=self.misses, size=len(self.cache), hit_rate=self.hits / max(1, total))
+
+_preset_matchers = {}
+
+def register_preset(name, file=re_null, func=re_null):
+    """Add or replace a named filter preset, compiling its patterns once.
+
+    Calls using the preset share one FrameMatcher, so its decision cache carries over between calls.
+    """
+    re_presets[name] = dict(file=file, func=func)
+    _preset_matchers[name] = FrameMatcher(file, func)
+
+def preset_matcher(name):
+    """The shared FrameMatcher for a registered preset."""
+    if name not in _preset_matchers:
+        register_preset(name, **re_presets[name])  # preset added directly to re_presets
+    return _preset_matchers[name]
+
+for _name, _patterns in list(re_presets.items()):
+    register_preset(_name, **_patterns)
+
 def filter_python_output(
     text,
     entrypoint=None,
@@ -25,49 +92,254 @@ def filter_python_output(
     **kw,
 ):
     # if entrypoint == 'codetool': return text
-    if preset and re_file == re_null: re_file = re_presets[preset]['file']
-    if preset and re_func == re_null: re_func = re_presets[preset]['func']
-    if isinstance(re_file, str): re_file = re.compile(re_file)
-    if isinstance(re_func, str): re_func = re.compile(re_func)
-    result = []
-    file, lineno, func, block = None, None, None, None
-    skipped = []
     lines = text.splitlines()
     if len(lines) < minlines:
         return text
+    result = filter_python_output_lines(
+        lines,
+        re_file,
+        re_func,
+        preset,
+        minlines=0,
+        filter_numpy_version_nonsense=filter_numpy_version_nonsense,
+        keep_blank_lines=keep_blank_lines,
+        **kw,
+    )
+    return os.linesep.join(result) + os.linesep
+
+def filter_python_output_lines(
+    lines,
+    re_file=re_null,
+    re_func=re_null,
+    preset=None,
+    filter_numpy_version_nonsense=True,
+    engine=None,
+    **kw,
+):
+    """Lazily filter an iterable of lines, yielding output lines as soon as they are final.
+
+    Lines may keep their line endings. Useful for piping live test output through the filter. The default
+    engine is PythonOutputFilter; pass engine=BytesPythonOutputFilter to filter bytes lines.
+
+    Example:
+        >>> lines = ['Traceback (most recent call last):', '  File "a.py", line 1, in main', '    main()',
+        ...          '  File "b.py", line 2, in f', '    1/0', 'ZeroDivisionError: division by zero']
+        >>> print(*filter_python_output_lines(lines, preset='boilerplate', minlines=0), sep='\\n')
+        Traceback (most recent call last):
+          main ->
+          File "b.py", line 2, in f
+            1/0
+        ZeroDivisionError: division by zero
+    """
+    result = _feed_all((engine or PythonOutputFilter)(re_file, re_func, preset, **kw), lines)
+    if filter_numpy_version_nonsense:
+        result = _feed_all(NoiseFilter(), result)
+    yield from result
+
+def _feed_all(engine, lines):
     for line in lines:
+        yield from engine.feed(line)
+    yield from engine.flush()
+
+class PythonOutputFilter:
+    """Incremental engine behind filter_python_output.
+
+    feed() lines as they arrive and get back the filtered lines that are ready. Only the lines of the
+    current traceback frame are held back (at most max_block_lines of them), plus the first minlines
+    lines, which are passed through unfiltered if the stream turns out to be shorter than that.
+    """
+    re_block, re_end, re_traceback, newline = re_block, re_end, re_traceback, '\r\n'
+
+    def __init__(
+        self,
+        re_file=re_null,
+        re_func=re_null,
+        preset=None,
+        minlines=30,
+        keep_blank_lines=False,
+        max_block_lines=1000,
+        **kw,
+    ):
+        if preset and re_file == re_null and re_func == re_null:
+            self.matcher = preset_matcher(preset)
+        else:
+            if preset and re_file == re_null: re_file = re_presets[preset]['file']
+            if preset and re_func == re_null: re_func = re_presets[preset]['func']
+            self.matcher = FrameMatcher(re_file, re_func)
+        self.minlines, self.keep_blank_lines, self.max_block_lines = minlines, keep_blank_lines, max_block_lines
+        self.file, self.lineno, self.func, self.block = None, None, None, None
+        self.skipped = []
+        self.head = [] if minlines > 0 else None
+
+    def feed(self, line):
+        """Process one line, returning the list of output lines it completes."""
+        line = line.rstrip(self.newline)
+        if self.head is not None:
+            self.head.append(line)
+            if len(self.head) < self.minlines: return []
+            head, self.head = self.head, None
+            return [out for line in head for out in self.feed(line)]
+        result = []
         line = _strip_line_extra_whitespace(line)
-        if not line.strip() and not keep_blank_lines: continue
-        if m := re_block.match(line):
-            _finish_block(block, file, func, re_file, re_func, result, skipped)
-            file, linene, func, block = *m.groups(), [line]
-        elif m := re_end.match(line):
-            _finish_block(block, file, func, re_file, re_func, result, skipped, keep=True)
-            file, lineno, func, block = None, None, None, None
-            result.append(line)
-        elif block:
-            block.append(line)
+        if not line.strip() and not self.keep_blank_lines: return result
+        if m := self.re_block.match(line):
+            self._finish_block(result)
+            self.file, self.lineno, self.func = map(self._decode, m.groups())
+            self.block = [line]
+        elif self.re_end.match(line):
+            self._finish_block(result, keep=True)
+            _flush_skipped(result, self.skipped)
+            result.append(self._decode(line))
+        elif self.re_traceback.match(line):
+            self._finish_block(result)  # a new traceback ends any unfinished one
+            _flush_skipped(result, self.skipped)
+            result.append(self._decode(line))
+        elif self.block:
+            self.block.append(line)
+            if self.max_block_lines and len(self.block) > self.max_block_lines:
+                # too long to be a frame, print it all and pass lines through until the next one starts
+                _flush_skipped(result, self.skipped)
+                result.extend(map(self._decode, self.block))
+                self.file, self.lineno, self.func, self.block = None, None, None, None
         else:
-            result.append(line)
-    text = os.linesep.join(result) + os.linesep
-    if filter_numpy_version_nonsense:
-        text = _filter_numpy_version_nonsense(text)
-    return text
+            result.append(self._decode(line))
+        return result
+
+    def flush(self):
+        """Return all remaining output at the end of the stream."""
+        if self.head is not None:
+            head, self.head = self.head, None
+            return list(map(self._decode, head))
+        result = []
+        self._finish_block(result)
+        _flush_skipped(result, self.skipped)  # as a following traceback header would
+        return result
+
+    def _finish_block(self, result, keep=False):
+        kept = []
+        _finish_block(self.block, self.file, self.func, self.matcher, kept, self.skipped, keep)
+        result.extend(map(self._decode, kept))
+        self.file, self.lineno, self.func, self.block = None, None, None, None
+
+    def _decode(self, line):
+        return line
+
+class BytesPythonOutputFilter(PythonOutputFilter):
+    """PythonOutputFilter fed raw bytes lines, e.g. from an mmap.
+
+    Lines are scanned with bytes regexes; only the lines it emits and the file / function names of
+    traceback frames are decoded. Output lines are str.
+    """
+    re_block, re_end, re_traceback = (re.compile(r.pattern.encode()) for r in (re_block, re_end, re_traceback))
+    newline = b'\r\n'
+
+    def _decode(self, line):
+        return line.decode(errors='replace') if isinstance(line, bytes) else line
+
+noise_signatures = {}
+
+def register_noise_signature(name, lines, regex=False):
+    """Add or replace a known block of noise lines to drop from filtered output.
+
+    lines is a multi-line string or a list of lines, each matched against a whole (whitespace-stripped)
+    output line, literally or as a regex. Blank lines are ignored both in the signature and in the
+    output, so one signature covers the variants with and without blank lines.
+    """
+    if isinstance(lines, str): lines = lines.splitlines()
+    lines = [line.strip() for line in lines if line.strip()]
+    if not regex: lines = [re.escape(line) for line in lines]
+    noise_signatures[name] = [re.compile(line) for line in lines]
+
+register_noise_signature(
+    'numpy2_abi',
+    r"""
+    A module that was compiled using NumPy 1\.x cannot be run in
+    NumPy [\d.]+ as it may crash\. To support both 1\.x and 2\.x
+    versions of NumPy, modules must be compiled with NumPy 2\.0\.
+    Some module may need to rebuild instead e\.g\. with 'pybind11>=[\d.]+'\.
+    If you are a user of the module, the easiest solution will be to
+    downgrade to 'numpy<2' or try to upgrade the affected module\.
+    We expect that some modules will need time to support NumPy 2\.
+    """,
+    regex=True,
+)
+register_noise_signature('numexpr_array_api', """
+    from numexpr.interpreter import MAX_THREADS, use_vml, __BLOCK_SIZE1__
+    AttributeError: _ARRAY_API not found
+""")
+register_noise_signature('numpy2_array_api', 'AttributeError: _ARRAY_API not found')
+
+class NoiseFilter:
+    """Drops registered noise signatures from a stream of lines in a single pass.
+
+    A combined regex of all the signatures' first lines rejects most lines with one match, so adding
+    signatures does not add passes. Only lines that might begin a signature are held back, at most
+    max_pending of them.
+
+    Example:
+        >>> noise = NoiseFilter()
+        >>> lines = ['a', '    from numexpr.interpreter import MAX_THREADS, use_vml, __BLOCK_SIZE1__',
+        ...          'AttributeError: _ARRAY_API not found', 'b']
+        >>> [out for line in lines for out in noise.feed(line)] + noise.flush()
+        ['a', 'b']
+    """
+
+    def __init__(self, signatures=None, max_pending=100):
+        self.signatures = list((noise_signatures if signatures is None else signatures).values())
+        firsts = '|'.join(f'(?:{sig[0].pattern})' for sig in self.signatures if sig)
+        self.re_first = re.compile(firsts) if firsts else re.compile(re_null)
+        self.max_pending = max_pending
+        self.pending = []
+
+    def feed(self, line):
+        """Process one line, returning the list of output lines it completes."""
+        self.pending.append(line)
+        return self._drain(final=len(self.pending) > self.max_pending)
 
-def _finish_block(block, file, func, re_file, re_func, result, skipped, keep=False):
+    def flush(self):
+        """Return all remaining output at the end of the stream."""
+        return self._drain(final=True)
+
+    def _drain(self, final):
+        result = []
+        while self.pending:
+            nmatched = self._match()
+            if nmatched is None and not final: break  # could still be the start of a signature
+            if nmatched: del self.pending[:nmatched]
+            else: result.append(self.pending.pop(0))
+        return result
+
+    def _match(self):
+        """Number of pending lines a signature consumes, None if one might still match, or 0."""
+        if not self.re_first.fullmatch(self.pending[0].strip()): return 0
+        partial = False
+        for sig in self.signatures:
+            isig = 0
+            for iline, line in enumerate(self.pending):
+                if not (line := line.strip()): continue
+                if not sig[isig].fullmatch(line): break
+                isig += 1
+                if isig == len(sig): return iline + 1
+            else:
+                partial = True
+        return None if partial else 0
+
+def _finish_block(block, file, func, matcher, result, skipped, keep=False):
     if block:
-        filematch = re_file.search(file)
-        funcmatch = re_func.search(func)
+        filematch, funcmatch = matcher.match(file, func)
         if filematch or funcmatch and not keep:
             file = os.path.basename(file.replace('/__init__.py', '[init]'))
             skipped.append(file if func == '<module>' else func)
         else:
-            if skipped:
-                # result.append('  [' + str.join('] => [', skipped) + '] =>')
-                result.append('  ' + str.join(' -> ', skipped) + ' ->')
-                skipped.clear()
+            _flush_skipped(result, skipped)
             result.extend(block)
 
+def _flush_skipped(result, skipped):
+    if skipped:
+        # result.append('  [' + str.join('] => [', skipped) + '] =>')
+        result.append('  ' + str.join(' -> ', skipped) + ' ->')
+        skipped.clear()
+
 def _strip_line_extra_whitespace(line):
     if not line[:60].strip(): return line.strip()
     return line.rstrip()
@@ -75,39 +347,6 @@ def _strip_line_extra_whitespace(line):
 # def _strip_text_extra_whitespace(text):
     # return re.sub(r'\n\n', os.linesep, text, re.MULTILINE)
 
-def _filter_numpy_version_nonsense(text):
-    text = text.replace(
-        """
-A module that was compiled using NumPy 1.x cannot be run in
-NumPy 2.2.3 as it may crash. To support both 1.x and 2.x
-versions of NumPy, modules must be compiled with NumPy 2.0.
-Some module may need to rebuild instead e.g. with 'pybind11>=2.12'.
-
-If you are a user of the module, the easiest solution will be to
-downgrade to 'numpy<2' or try to upgrade the affected module.
-We expect that some modules will need time to support NumPy 2.
-
-""", '')
-    text = text.replace(
-        """A module that was compiled using NumPy 1.x cannot be run in
-NumPy 2.2.3 as it may crash. To support both 1.x and 2.x
-versions of NumPy, modules must be compiled with NumPy 2.0.
-Some module may need to rebuild instead e.g. with 'pybind11>=2.12'.
-If you are a user of the module, the easiest solution will be to
-downgrade to 'numpy<2' or try to upgrade the affected module.
-We expect that some modules will need time to support NumPy 2.
-""", '')
-    text = text.replace(
-        """    from numexpr.interpreter import MAX_THREADS, use_vml, __BLOCK_SIZE1__
-AttributeError: _ARRAY_API not found
-""", '')
-    text = text.replace("""AttributeError: _ARRAY_API not found
-
-
-
-Traceback""", '')
-    return text
-
 '''Traceback (most recent call last):
   File "example.py", line 10, in <module>
     1/0
@@ -117,9 +356,6 @@ ISNR'''
 
 def analyze_python_errors_log(text):
     # traceback_pattern = re.compile(r'Traceback \(most recent call last\):.*?\n[A-Za-z]+?Error:.*?$', re.DOTALL)
-    traceback_pattern = re.compile(r'Traceback \(most recent call last\):.*?(?=\nTraceback |\Z)', re.DOTALL)
-    file_line_pattern = re.compile(r'\n\s*File "(.*?\.py)", line (\d+), in ')
-    error_pattern = re.compile(r'\n\s*[A-Za-z_0-9]+Error: .*')
     """Analyze Python error logs and create a report of unique stack traces.
 
     Args:
@@ -137,25 +373,123 @@ def analyze_python_errors_log(text):
         >>> 'Unique Stack Traces Report (1 unique traces):' in result
         True
     """
-    trace_map = defaultdict(list)
-    tracebacks = traceback_pattern.findall(text)
-    for trace in tracebacks:
-        filematch = file_line_pattern.search(trace)
-        errmatch = error_pattern.search(trace)
-        assert filematch and errmatch, f'Error pattern not found in {trace}'
-        location = ':'.join(filematch.groups())
-        error = errmatch.group(0).strip()
-        key = (location, error)
-        if key not in trace_map:
-            trace_map[key] = trace
-    return create_errors_log_report(trace_map)
-
-def create_errors_log_report(trace_map):
+    collector = collect_python_error_traces(text)
+    return create_errors_log_report(collector.traces, collector.malformed)
+
+def collect_python_error_traces(text, start=0, end=None):
+    """Run a TracebackCollector over a str, bytes or mmap, optionally only over text[start:end]."""
+    end = len(text) if end is None else end
+    if isinstance(text, str): lines = text[start:end].splitlines(keepends=True)
+    else: lines = _mapped_lines(text, start, end)
+    collector = TracebackCollector(offset=start)
+    for line in lines:
+        collector.feed(line)
+    return collector.flush()
+
+@dataclass
+class TraceInfo:
+    """A unique traceback signature: the first trace seen, how often it occurred and where."""
+    trace: str
+    count: int = 1
+    first: int = 0  # offset of the first occurrence in the log
+    last: int = 0  # offset of the last occurrence
+    files: dict = field(default_factory=dict)  # log file -> count, when merged across logs
+
+    def merge(self, other):
+        """Fold in the occurrences of the same signature from another part of the log, or another log."""
+        if other.first < self.first and not other.files: self.trace = other.trace
+        self.count += other.count
+        self.first, self.last = min(self.first, other.first), max(self.last, other.last)
+        for file, count in other.files.items():
+            self.files[file] = self.files.get(file, 0) + count
+
+class TracebackCollector:
+    """Single pass, line-driven traceback deduplication behind analyze_python_errors_log.
+
+    A traceback runs from its 'Traceback (most recent call last):' header to its error line. Its signature
+    is the first 'File "....py", line N' location plus the error line; traces missing either are counted
+    in malformed. A trace also ends, as malformed, at an unindented line that is not its error line (e.g.
+    'myapp.Failure: boom') or after max_trace_lines lines. Memory is bounded by the number of unique
+    signatures: only the current trace is held and, per signature, one example, a count and first/last
+    offsets.
+    Lines can be str or bytes; bytes outside of traces are never decoded.
+
+    Example:
+        >>> collector = TracebackCollector()
+        >>> for line in ['Traceback (most recent call last):', '  File "a.py", line 1, in f', '    1/0',
+        ...              'ZeroDivisionError: division by zero', 'Traceback (most recent call last):', 'junk']:
+        ...     collector.feed(line + '\\n')
+        >>> info = collector.flush().traces['a.py:1', 'ZeroDivisionError: division by zero']
+        >>> info.count, info.first, info.last
+        (1, 0, 0)
+        >>> collector.malformed
+        1
+    """
+    re_location = re.compile(r'\s*File "(.*?\.py)", line (\d+), in ')
+    re_error = re.compile(r'[A-Za-z_][\w.]*(Error|Exception|Exit|Interrupt)(: .*)?$|\s+\w+Error: ')
+    re_chained = re.compile(r'During handling|The above exception')
+
+    def __init__(self, offset=0, max_trace_lines=1000):
+        self.traces = {}
+        self.malformed = 0
+        self.offset, self.max_trace_lines = offset, max_trace_lines
+        self.lines, self.location, self.start = None, None, 0
+
+    def feed(self, line):
+        """Process one line of the log."""
+        pos = self.offset
+        self.offset += len(line)
+        if isinstance(line, bytes):
+            if self.lines is None and not line.startswith(traceback_header[1:]): return
+            line = line.decode(errors='replace')
+        line = line.rstrip('\r\n')
+        if re_traceback.match(line):
+            self._finish()
+            self.lines, self.location, self.start = [line], None, pos
+        elif self.lines is None:
+            return
+        else:
+            self.lines.append(line)
+            if self.location is None and (m := self.re_location.match(line)):
+                self.location = ':'.join(m.groups())
+            elif self.re_error.match(line):
+                self._finish(error=line.strip())
+            elif line and not line[0].isspace() and not self.re_chained.match(line):
+                self._finish()  # unrecognized error line, or not a trace after all
+            elif len(self.lines) >= self.max_trace_lines:
+                self._finish()
+
+    def flush(self):
+        """Finish any trace in progress and return self."""
+        self._finish()
+        return self
+
+    def merge(self, other):
+        """Fold in the results of a collector run over another part of the log."""
+        for key, info in other.traces.items():
+            if key in self.traces: self.traces[key].merge(info)
+            else: self.traces[key] = info
+        self.malformed += other.malformed
+        return self
+
+    def _finish(self, error=None):
+        if self.lines is None: return
+        if error is None or self.location is None:
+            self.malformed += 1
+        elif info := self.traces.get((self.location, error)):
+            info.count += 1
+            info.last = self.start
+        else:
+            self.traces[self.location, error] = TraceInfo('\n'.join(self.lines), 1, self.start, self.start)
+        self.lines, self.location = None, None
+
+def create_errors_log_report(trace_map, malformed=0):
     """Generate a report from a map of unique stack traces.
 
     Args:
         trace_map (dict): A dictionary where keys are unique error signatures
-            and values are corresponding stack traces.
+            and values are corresponding stack traces, or TraceInfo records.
+        malformed (int): Number of traces that could not be parsed.
 
     Returns:
         str: A formatted report of the unique stack traces.
@@ -169,10 +503,206 @@ def create_errors_log_report(trace_map):
         >>> 'Unique Stack Traces Report (1 unique traces):' in report
         True
     """
-    with evn.capture_stdio() as printed:
-        print(f"Unique Stack Traces Report ({len(trace_map)} unique traces):")
-        print("="*80 + "\n")
-        for (_, trace) in trace_map.items():
-            print(trace)
-            print("-"*80 + "\n")
-    return printed.read()
+    with io.StringIO() as out:
+        write_errors_log_report(trace_map, out, malformed)
+        return out.getvalue()
+
+def write_errors_log_report(trace_map, out, malformed=0, format='text'):
+    """Write the report of create_errors_log_report to out, one trace at a time.
+
+    Args:
+        trace_map (dict): signature -> trace (str or TraceInfo)
+        out: a text stream, or a path opened with open_log (so .gz etc. are compressed)
+        malformed (int): number of traces that could not be parsed
+        format (str): 'text' like create_errors_log_report, or 'jsonl' with one JSON object per signature
+            (signature, count, trace and, for TraceInfo, first, last and files), plus {"malformed": n} last
+
+    Example:
+        >>> import sys
+        >>> trace_map = {('a.py:1', 'KeyError: 1'): TraceInfo('Traceback ...\\nKeyError: 1', count=3)}
+        >>> write_errors_log_report(trace_map, sys.stdout, format='jsonl')
+        {"signature": ["a.py:1", "KeyError: 1"], "count": 3, "trace": "Traceback ...\\nKeyError: 1", "first": 0, "last": 0, "files": {}}
+    """
+    assert format in ('text', 'jsonl'), f'unknown report format {format}'
+    if not hasattr(out, 'write'):
+        with open_log(out, 'wt') as stream:
+            return write_errors_log_report(trace_map, stream, malformed, format)
+    if format == 'jsonl':
+        for signature, trace in trace_map.items():
+            signature = list(signature) if isinstance(signature, tuple) else signature
+            if isinstance(trace, TraceInfo):
+                record = dict(signature=signature, count=trace.count, trace=trace.trace, first=trace.first,
+                              last=trace.last, files=trace.files)
+            else:
+                record = dict(signature=signature, count=1, trace=trace)
+            out.write(json.dumps(record) + '\n')
+        if malformed: out.write(json.dumps(dict(malformed=malformed)) + '\n')
+        return
+    out.write(f"Unique Stack Traces Report ({len(trace_map)} unique traces):\n")
+    out.write("="*80 + "\n\n")
+    for trace in trace_map.values():
+        if isinstance(trace, TraceInfo) and trace.files:
+            files = ', '.join(f'{file} ({n})' for file, n in list(trace.files.items())[:5])
+            more = f', and {len(trace.files) - 5} more' if len(trace.files) > 5 else ''
+            out.write(f"{trace.trace}\n[{trace.count} occurrences in {len(trace.files)} files: {files}{more}]\n")
+        elif isinstance(trace, TraceInfo):
+            out.write(f"{trace.trace}\n[{trace.count} occurrences, first at offset {trace.first}, "
+                      f"last at offset {trace.last}]\n")
+        else:
+            out.write(f"{trace}\n")
+        out.write("-"*80 + "\n\n")
+    if malformed:
+        out.write(f"{malformed} malformed traces skipped\n")
+
+def filter_python_output_file(source, nprocs=None, chunk_bytes=16 << 20, minlines=30, **kw):
+    """Filter a log file (path or mmap), splitting it at traceback headers and filtering the chunks in
+    a process pool.
+
+    The file is memory-mapped and scanned as bytes a line at a time, so it is never read into memory as a
+    whole and only emitted lines are decoded. The result is the same as filter_python_output on the
+    decoded file. Filter options (preset, re_file, ...) are passed through in kw. Compressed files (gzip,
+    xz, bz2) are decompressed as a stream and filtered serially.
+    """
+    if not isinstance(source, mmap.mmap) and log_compression(source):
+        with open_log(source) as inp:
+            lines = filter_python_output_lines(inp, engine=BytesPythonOutputFilter, minlines=minlines, **kw)
+            return ''.join(line + os.linesep for line in lines)
+    with _mapped(source) as mm:
+        if _count_lines(mm, minlines) < minlines:
+            return mm[:].decode(errors='replace')
+        chunks = _log_chunks(mm, chunk_bytes)
+        if isinstance(source, mmap.mmap) or nprocs == 1 or len(chunks) == 1:
+            results = [_filter_mapped_chunk(mm, start, end, kw) for start, end in chunks]
+        else:
+            results = _map_log_chunks(_filter_log_chunk, [(source, start, end, kw) for start, end in chunks], nprocs)
+    return ''.join(line + os.linesep for lines in results for line in lines)
+
+def analyze_python_errors_log_file(source, nprocs=None, chunk_bytes=16 << 20):
+    """Like analyze_python_errors_log on a file (path or mmap), scanning the mapped bytes and decoding
+    only the traces. Chunks are analyzed in a process pool. Compressed files (gzip, xz, bz2) are
+    decompressed as a stream and analyzed serially."""
+    collector = collect_python_error_traces_file(source, nprocs, chunk_bytes)
+    return create_errors_log_report(collector.traces, collector.malformed)
+
+def analyze_python_errors_logs(sources, nprocs=None):
+    """One report of the unique traces in many log files, see log_files for what sources can be.
+
+    The files are analyzed in a process pool. Each signature in the report lists the files it occurred in.
+    """
+    collector = collect_python_error_traces_files(sources, nprocs)
+    return create_errors_log_report(collector.traces, collector.malformed)
+
+def collect_python_error_traces_files(sources, nprocs=None):
+    """Merged TracebackCollector of all the log_files(sources), one file per worker."""
+    paths = log_files(sources)
+    if nprocs == 1 or len(paths) < 2 or '-' in paths: results = map(_collect_log_file, paths)
+    else: results = _map_log_chunks(_collect_log_file, [(path, ) for path in paths], nprocs)
+    collector = TracebackCollector()
+    for result in results:
+        collector.merge(result)
+    return collector
+
+def log_files(sources):
+    """Sorted log files named by sources: paths of files or directories (all files below them), glob patterns
+    or '-' for stdin.
+
+    Example:
+        >>> import tempfile
+        >>> tmp = tempfile.mkdtemp()
+        >>> for name in ['a.log', 'b.log.gz', 'sub/c.log']:
+        ...     os.makedirs(os.path.dirname(os.path.join(tmp, name)), exist_ok=True)
+        ...     open(os.path.join(tmp, name), 'w').close()
+        >>> [os.path.relpath(f, tmp) for f in log_files([tmp])]
+        ['a.log', 'b.log.gz', 'sub/c.log']
+        >>> [os.path.relpath(f, tmp) for f in log_files([f'{tmp}/*.log', f'{tmp}/a.log'])]
+        ['a.log']
+    """
+    if isinstance(sources, (str, os.PathLike)): sources = [sources]
+    files = set()
+    for source in map(str, sources):
+        if source == '-':
+            files.add(source)
+        elif os.path.isdir(source):
+            files.update(os.path.join(dir, f) for dir, _, names in os.walk(source) for f in names)
+        elif os.path.isfile(source):
+            files.add(source)
+        else:
+            files.update(f for f in glob.glob(source, recursive=True) if os.path.isfile(f))
+    return sorted(files)
+
+def collect_python_error_traces_file(source, nprocs=None, chunk_bytes=16 << 20):
+    """TracebackCollector of a whole file (path, '-' for stdin, or mmap), see analyze_python_errors_log_file."""
+    collector = TracebackCollector()
+    if source == '-' or not isinstance(source, mmap.mmap) and log_compression(source):
+        with open_log(source) as inp:
+            for line in inp:
+                collector.feed(line)
+        collector.flush()
+    else:
+        with _mapped(source) as mm:
+            chunks = _log_chunks(mm, chunk_bytes)
+            if isinstance(source, mmap.mmap) or nprocs == 1 or len(chunks) == 1:
+                results = [collect_python_error_traces(mm, start, end) for start, end in chunks]
+            else:
+                results = _map_log_chunks(_analyze_log_chunk, [(source, start, end) for start, end in chunks], nprocs)
+        for result in results:
+            collector.merge(result)
+    return collector
+
+@contextlib.contextmanager
+def _mapped(source):
+    """Read-only mmap of a path, or source itself if it is already an mmap. Empty files give b''."""
+    if isinstance(source, mmap.mmap):
+        yield source
+        return
+    with open(source, 'rb') as inp:
+        if not os.fstat(inp.fileno()).st_size:
+            yield b''
+            return
+        with mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield mm
+
+def _count_lines(mm, limit):
+    """Number of lines in mm, counting no further than limit."""
+    nlines, pos = 0, 0
+    while nlines < limit and pos < len(mm):
+        pos = mm.find(b'\n', pos) + 1 or len(mm)
+        nlines += 1
+    return nlines
+
+def _mapped_lines(mm, start, end):
+    while start < end:
+        stop = mm.find(b'\n', start, end) + 1 or end
+        yield mm[start:stop]
+        start = stop
+
+def _log_chunks(mm, chunk_bytes):
+    """(start, end) byte ranges of about chunk_bytes, each but the first starting on a traceback header."""
+    bounds = [0]
+    while bounds[-1] + chunk_bytes < len(mm):
+        pos = mm.find(traceback_header, bounds[-1] + chunk_bytes - 1)
+        if pos < 0: break
+        bounds.append(pos + 1)
+    return list(zip(bounds, bounds[1:] + [len(mm)]))
+
+def _map_log_chunks(func, args, nprocs):
+    with ProcessPoolExecutor(nprocs) as pool:
+        return list(pool.map(func, *zip(*args)))
+
+def _collect_log_file(path):
+    collector = collect_python_error_traces_file(path, nprocs=1)
+    for info in collector.traces.values():
+        info.files[path] = info.count
+    return collector
+
+def _filter_log_chunk(path, start, end, kw):
+    with _mapped(path) as mm:
+        return _filter_mapped_chunk(mm, start, end, kw)
+
+def _filter_mapped_chunk(mm, start, end, kw):
+    lines = _mapped_lines(mm, start, end)
+    return list(filter_python_output_lines(lines, engine=BytesPythonOutputFilter, minlines=0, **kw))
+
+def _analyze_log_chunk(path, start, end):
+    with _mapped(path) as mm:
+        return collect_python_error_traces(mm, start, end)
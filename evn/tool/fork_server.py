@@ -0,0 +1,180 @@
+"""
+usage: python -m evn.tool.fork_server [--preload torch,numpy,...] [--address PATH]
+
+Warm server for run_tests_on_file. Importing a heavy project before the first test runs takes seconds; the
+server imports the --preload modules once, then forks a child per request that runs the python command
+(-m pytest ..., a script or -c code) in-process, streaming its stdout and stderr back over a unix socket.
+
+Preload third-party modules, not the code being edited: a child sees modules as they were when the server
+imported them. To be safe, the server re-executes itself when a file of any imported module has changed.
+
+Requests carry the client's environment, so the default socket lives in a directory only its user can
+access ($XDG_RUNTIME_DIR, or a private directory in the temp dir), and where the platform supports
+SO_PEERCRED, both ends check that the other runs as the same user before anything is sent.
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import runpy
+import socket
+import stat
+import struct
+import sys
+import tempfile
+
+_exit_marker = b'\0evn-fork-server-exit:'
+
+def default_address():
+    """The socket path in this user's private directory, see _private_dir."""
+    return os.path.join(_private_dir(), 'evn-fork-server.sock')
+
+def _private_dir():
+    """$XDG_RUNTIME_DIR, else a directory in the temp dir created with mode 0700. Raises PermissionError if
+    it exists but belongs to someone else or others can access it."""
+    if (dir := os.environ.get('XDG_RUNTIME_DIR')) and _is_private(dir): return dir
+    dir = os.path.join(tempfile.gettempdir(), f'evn-fork-server-{os.getuid()}')
+    with contextlib.suppress(FileExistsError):
+        os.mkdir(dir, 0o700)
+    if not _is_private(dir): raise PermissionError(f'{dir} is not a directory private to this user')
+    return dir
+
+def _is_private(dir):
+    try:
+        st = os.lstat(dir)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and st.st_uid == os.getuid() and not st.st_mode & 0o077
+
+def _peer_uid(conn):
+    """uid of the process at the other end of a unix socket, None if the platform can't tell."""
+    if not hasattr(socket, 'SO_PEERCRED'): return None
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+def _same_user(conn):
+    return _peer_uid(conn) in (None, os.getuid())
+
+def serve(address=None, preload=()):
+    """Import the preload modules, then run requests until killed."""
+    address = address or default_address()
+    for module in preload:
+        importlib.import_module(module)
+    mtimes = _module_mtimes()
+    if os.path.exists(address): os.unlink(address)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(address)
+        os.chmod(address, 0o600)
+        server.listen()
+        print(f'evn fork server on {address}, preloaded {", ".join(preload) or "nothing"}', flush=True)
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                try:
+                    if not _same_user(conn): continue
+                    with conn.makefile('rb') as inp:
+                        request = json.loads(inp.readline())
+                    if _module_mtimes() != mtimes:
+                        conn.sendall(_exit_marker + b'restart')
+                        server.close()
+                        os.execv(sys.executable, [sys.executable, '-m', 'evn.tool.fork_server', '--address',
+                                                  address, '--preload', ','.join(preload)])
+                    pid = os.fork()
+                    if pid == 0:
+                        server.close()
+                        _run_child(conn, request)
+                    _, status = os.waitpid(pid, 0)
+                    conn.sendall(_exit_marker + str(os.waitstatus_to_exitcode(status)).encode())
+                except (OSError, ValueError):
+                    continue  # the client hung up or sent garbage, serve the next one
+
+def _run_child(conn, request):
+    code = 1
+    try:
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        with open(1, 'w', buffering=1, closefd=False) as stdout:
+            with open(2, 'w', buffering=1, closefd=False) as stderr:
+                sys.stdout, sys.stderr = stdout, stderr
+                code = _run_request(request)
+    finally:
+        os._exit(code or 0)
+
+def _run_request(request):
+    try:
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        pythonpath = request['env'].get('PYTHONPATH', '')
+        sys.path[1:1] = [p for p in pythonpath.split(os.pathsep) if p]
+        return _run_python(request['argv'])
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int): return e.code or 0
+        print(e.code, file=sys.stderr)
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+    return 1
+
+def _run_python(argv):
+    """Run argv (python's arguments) like the python command line would."""
+    if argv[0] == '-m':
+        sys.argv, sys.path[0] = argv[1:], os.getcwd()
+        runpy.run_module(argv[1], run_name='__main__', alter_sys=True)
+    elif argv[0] == '-c':
+        sys.argv, sys.path[0] = ['-c'] + argv[2:], os.getcwd()
+        exec(compile(argv[1], '<string>', 'exec'), dict(__name__='__main__'))
+    else:
+        sys.argv, sys.path[0] = argv, os.path.dirname(os.path.abspath(argv[0]))
+        runpy.run_path(argv[0], run_name='__main__')
+    return 0
+
+def run_in_server(argv, env=None, cwd=None, address=None, out=None):
+    """
+    Run python with argv in a fork of the server, writing its output to out (default sys.stdout.buffer).
+
+    Returns:
+        int: the exit code, or None if no server of this user is listening at address or it is restarting
+    """
+    out = out or sys.stdout.buffer
+    request = dict(argv=argv, env=dict(os.environ if env is None else env), cwd=cwd or os.getcwd())
+    try:
+        address = address or default_address()
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.connect(address)
+    except (AttributeError, OSError):
+        return None
+    with conn:
+        if not _same_user(conn): return None
+        conn.sendall(json.dumps(request).encode() + b'\n')
+        tail = b''
+        while chunk := conn.recv(1 << 16):
+            tail += chunk
+            if _exit_marker in tail: continue
+            keep = len(_exit_marker)  # the marker may be split across chunks
+            out.write(tail[:-keep])
+            out.flush()
+            tail = tail[-keep:]
+    output, _, code = tail.partition(_exit_marker)
+    out.write(output)
+    out.flush()
+    return int(code) if code.lstrip(b'-').isdigit() else None
+
+def _module_mtimes():
+    mtimes = {}
+    for module in list(sys.modules.values()):
+        file = getattr(module, '__file__', None)
+        if file and os.path.exists(file): mtimes[file] = os.path.getmtime(file)
+    return mtimes
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--address', default=default_address())
+    parser.add_argument('--preload', default='', help='comma separated modules to import up front')
+    args = parser.parse_args()
+    serve(args.address, [m for m in args.preload.split(',') if m])
+
+if __name__ == '__main__':
+    main()
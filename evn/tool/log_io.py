@@ -0,0 +1,67 @@
+"""
+open log files that may be gzip, xz or bz2 compressed
+
+Reading detects the compression from the first bytes of the file, so a misnamed file still works.
+Writing picks it from the file suffix. Everything streams; nothing is decompressed to disk or into memory
+as a whole.
+"""
+
+import bz2
+import contextlib
+import gzip
+import io
+import lzma
+import os
+import sys
+
+_magic = {b'\x1f\x8b': gzip, b'\xfd7zXZ\x00': lzma, b'BZh': bz2}
+_suffixes = {'.gz': gzip, '.gzip': gzip, '.xz': lzma, '.lzma': lzma, '.bz2': bz2}
+
+def log_compression(path):
+    """The stdlib module (gzip, lzma or bz2) that decompresses path, or None if it is not compressed."""
+    if path == '-': return None
+    with open(path, 'rb') as inp:
+        return _compression_of_head(inp.read(6))
+
+def _compression_of_head(head):
+    for magic, module in _magic.items():
+        if head.startswith(magic): return module
+    return None
+
+@contextlib.contextmanager
+def open_log(path, mode='rb', encoding='utf-8', errors='replace'):
+    """Open a possibly compressed log file, or stdin for '-'. A context manager, so every layer (file,
+    decompressor, text wrapper) is closed on exit, also when opening or reading fails part way.
+
+    Args:
+        path: file path, or '-' to read stdin
+        mode: 'rb' / 'rt' to read, decompressing by magic bytes; 'wb' / 'wt' / 'ab' / 'at' to write,
+            compressing by suffix (.gz, .xz, .bz2)
+    Yields:
+        a file object; binary unless mode contains 't'
+
+    Example:
+        >>> import tempfile
+        >>> path = os.path.join(tempfile.mkdtemp(), 'log.txt.gz')
+        >>> with open_log(path, 'wt') as out: _ = out.write('Traceback\\n')
+        >>> with open(path, 'rb') as inp: inp.read(2)
+        b'\\x1f\\x8b'
+        >>> with open_log(path, 'rt') as inp: inp.read()
+        'Traceback\\n'
+    """
+    binmode = mode.replace('t', '').replace('b', '') + 'b'
+    with contextlib.ExitStack() as stack:
+        if 'r' in mode:
+            if path == '-':
+                raw = stack.enter_context(open(sys.stdin.fileno(), 'rb', closefd=False))
+                module = _compression_of_head(raw.peek(6)[:6])
+                stream = stack.enter_context(module.open(raw, 'rb')) if module else raw
+            else:
+                module = log_compression(path)
+                stream = stack.enter_context((module.open if module else open)(path, 'rb'))
+        else:
+            module = _suffixes.get(os.path.splitext(str(path))[1].lower())
+            stream = stack.enter_context((module.open if module else open)(path, binmode))
+        if 't' in mode:
+            stream = stack.enter_context(io.TextIOWrapper(stream, encoding=encoding, errors=errors))
+        yield stream
@@ -0,0 +1,178 @@
+"""
+on-disk index of a project tree for run_tests_on_file
+
+dispatch asks, per request, which files exist and which have a main block. On network filesystems the
+repeated reads and stats add up, so ProjectIndex caches directory listings, main-block presence and the
+modules each file imports (parsed with ast) in a json file. Each entry is checked against the mtime of its
+directory or file with a single stat, so only changed files are re-read. The import graph gives the test
+files affected by a change: those that import the changed module, directly or transitively.
+"""
+
+import ast
+import json
+import os
+from evn.tool.run_tests_on_file import file_has_main
+
+_version = 2
+_skip_dirs = {'__pycache__', 'build', '_build', 'node_modules'}
+
+class ProjectIndex:
+    """
+    Cached directory listings, main-block flags and imports under root, stored in path (relative to root).
+
+    Example:
+        >>> import tempfile
+        >>> root = tempfile.mkdtemp()
+        >>> with open(os.path.join(root, 'a.py'), 'w') as out: _ = out.write('if __name__ == "__main__": pass')
+        >>> with open(os.path.join(root, 'test_a.py'), 'w') as out: _ = out.write('import a')
+        >>> index = ProjectIndex(root)
+        >>> index.exists(os.path.join(root, 'a.py')), index.exists(os.path.join(root, 'b.py'))
+        (True, False)
+        >>> index.has_main(os.path.join(root, 'a.py'))
+        True
+        >>> [os.path.basename(f) for f in index.affected_tests(os.path.join(root, 'a.py'))]
+        ['test_a.py']
+        >>> index.save()
+        >>> sorted(ProjectIndex(root).files)
+        ['a.py', 'test_a.py']
+    """
+
+    def __init__(self, root='.', path='.evn_project_index.json'):
+        self.root, self.path = os.path.abspath(root), os.path.join(os.path.abspath(root), path)
+        self.dirs, self.files, self.dirty = {}, {}, False
+        try:
+            with open(self.path) as inp:
+                data = json.load(inp)
+            if data.get('version') == _version: self.dirs, self.files = data['dirs'], data['files']
+        except (OSError, ValueError):
+            pass
+
+    def scan(self):
+        """List every directory below root, skipping hidden and build ones, so later lookups are cache hits."""
+        self.python_files()
+        return self
+
+    def python_files(self, dir=None):
+        """All .py files below dir (default root), from the cached listings."""
+        dir = dir or self.root
+        files = []
+        for name in self._listing(dir) or []:
+            if name.endswith('/'):
+                if not name.startswith('.') and name[:-1] not in _skip_dirs:
+                    files += self.python_files(os.path.join(dir, name[:-1]))
+            elif name.endswith('.py'):
+                files.append(os.path.join(dir, name))
+        return files
+
+    def exists(self, fname):
+        """os.path.exists for files, from the cached listing of the file's directory."""
+        listing = self._listing(os.path.dirname(os.path.abspath(fname)))
+        return listing is not None and os.path.basename(fname) in listing
+
+    def has_main(self, fname):
+        """file_has_main, cached until the file changes."""
+        entry = self._entry(fname)
+        if entry is None: return False
+        if 'has_main' not in entry:
+            entry['has_main'], self.dirty = file_has_main(fname), True
+        return entry['has_main']
+
+    def imports(self, fname):
+        """Absolute names of the modules fname imports, cached until the file changes."""
+        entry = self._entry(fname)
+        if entry is None: return []
+        if 'imports' not in entry:
+            entry['imports'], self.dirty = _imports(fname, self.module_name(fname)), True
+        return entry['imports']
+
+    def module_name(self, fname):
+        """Dotted module name of fname, counting up through the directories that have an __init__.py."""
+        dir, name = os.path.split(os.path.abspath(fname))
+        parts = [] if name == '__init__.py' else [name[:-3]]
+        while self.exists(os.path.join(dir, '__init__.py')) and dir != os.path.dirname(dir):
+            dir, package = os.path.split(dir)
+            parts.insert(0, package)
+        return '.'.join(parts)
+
+    def affected_tests(self, fname):
+        """The test_*.py files that import fname's module, directly or through other project modules."""
+        files = self.python_files()
+        modules = {self.module_name(f): f for f in files}
+        importers = {}
+        for file in files:
+            for module in self.imports(file):
+                importers.setdefault(module, set()).add(file)
+        affected, todo = set(), [os.path.abspath(fname)]
+        while todo:
+            module = self.module_name(todo.pop())
+            for importer in importers.get(module, ()):
+                if importer not in affected:
+                    affected.add(importer)
+                    if modules.get(self.module_name(importer)) == importer: todo.append(importer)
+        return sorted(f for f in affected if os.path.basename(f).startswith('test_'))
+
+    def save(self):
+        """Write the index if anything changed, atomically so concurrent runs never see a partial file."""
+        if not self.dirty: return
+        tmp = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as out:
+            json.dump(dict(version=_version, dirs=self.dirs, files=self.files), out)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def _entry(self, fname):
+        key = self._key(fname)
+        try:
+            mtime = os.stat(fname).st_mtime
+        except OSError:
+            return None
+        entry = self.files.get(key)
+        if entry is None or entry['mtime'] != mtime:
+            entry = self.files[key] = dict(mtime=mtime)
+            self.dirty = True
+        return entry
+
+    def _listing(self, dir):
+        key = self._key(dir)
+        try:
+            mtime = os.stat(dir).st_mtime
+        except OSError:
+            return None
+        entry = self.dirs.get(key)
+        if entry is None or entry[0] != mtime:
+            with os.scandir(dir) as it:
+                names = sorted(e.name + '/' if e.is_dir() else e.name for e in it if e.path != self.path)
+            # saving the index touches its own directory, an unchanged listing needs no save
+            if entry is None or entry[1] != names: self.dirty = True
+            entry = self.dirs[key] = [mtime, names]
+        return entry[1]
+
+    def _key(self, fname):
+        return os.path.relpath(os.path.abspath(fname), self.root)
+
+def _imports(fname, module):
+    """Modules imported by fname, whose own module name is module. Also lists the parent packages, which
+    python imports first, and for 'from package import name', both package and package.name"""
+    try:
+        with open(fname, 'rb') as inp:
+            tree = ast.parse(inp.read(), str(fname))
+    except (SyntaxError, ValueError, OSError):
+        return []
+    package = module if os.path.basename(fname) == '__init__.py' else module.rpartition('.')[0]
+    imported = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ''
+            if node.level:
+                parent = package.rsplit('.', node.level - 1)[0] if node.level > 1 else package
+                base = f'{parent}.{base}'.strip('.')
+            names = [base] + [f'{base}.{alias.name}'.strip('.') for alias in node.names if alias.name != '*']
+        else:
+            continue
+        for name in names:
+            parts = name.split('.')
+            imported.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+    imported.discard('')
+    return sorted(imported)
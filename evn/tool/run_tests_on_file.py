@@ -8,17 +8,27 @@ This script exists for easy editor integration with python test files. Dispatch:
 3. If the file is not a test_* file and does not have a main block, look for a test_* file in tests with the same path. for example rf_diffusion/foo/bar.py will look for rf_diffusion/tests/foo/test_bar.py
 4. If none of the above, or no file specified, run pytest
 
+With --duration_history, pytest runs with evn.tool.duration_history, which records how long each test takes;
+with that history, runs long enough to benefit are spread over pytest-xdist workers (-n), slowest tests first
+
+With --affected, a changed module in 3. instead runs every test_* file that imports it, directly or
+transitively, according to the import graph in evn.tool.project_index (falling back to 3. if there are none)
+
 _overrides can be set to manually specipy a command for a file
 _file_mappings can be set to mannually map a file to another file
+
+With --server, python commands run in a fork of a warm evn.tool.fork_server, if one is running
 """
 
 import argparse
 import os
+import shlex
 import sys
 from pathlib import Path
 from collections import defaultdict
-from time import perf_counter
 from assertpy import assert_that
+from evn.dev.timing import timed
+from evn.tool.duration_history import duration_args
 
 # set to manually specipy a command for a file
 _overrides = {
@@ -42,6 +52,10 @@ def get_args(sysargv):
     parser.add_argument('--pytest', action='store_true')
     parser.add_argument('--quiet', action='store_true')
     parser.add_argument('--filter_build_log', action='store_true')
+    parser.add_argument('--server', action='store_true', help='run cmd in a warm evn.tool.fork_server if running')
+    parser.add_argument('--index', action='store_true', help='cache file lookups in .evn_project_index.json')
+    parser.add_argument('--affected', action='store_true', help='run all tests importing a changed module')
+    parser.add_argument('--duration_history', action='store_true', help='record test durations, pick xdist -n')
     args = parser.parse_args(sysargv[1:])
     return args.__dict__
 
@@ -123,9 +137,17 @@ def dispatch(
         strict=True,
         pytest=False,
         python=None,
+        index=None,
+        affected=False,
+        duration_history=False,
         **kw,
 ):
-    'dispatch command for a given file. see above'
+    'dispatch command for a given file. see above. index is an optional evn.tool.project_index.ProjectIndex'
+    if affected and index is None:
+        from evn.tool.project_index import ProjectIndex
+        index = ProjectIndex()
+    has_main = index.has_main if index else file_has_main
+    exists = index.exists if index else os.path.exists
     # fname = locate_fname(fname)
     fname = os.path.relpath(fname)
     module_fname = '' if fname[:5] == 'test_' else fname
@@ -141,9 +163,21 @@ def dispatch(
         bname = file_mappings[bname][0]
         path, bname = os.path.split(bname)
 
-    if not file_has_main(fname) and not bname.startswith('test_'):
+    python = python or sys.executable
+    pythonpath = ':'.join(p for p in sys.path if 'python3' not in p)
+    pypath = f'PYTHONPATH={pythonpath}'
+
+    def with_durations(tests=()):
+        if not duration_history: return pytest_args
+        return f'{duration_args(tests, python, pythonpath)} {pytest_args}'.lstrip()
+
+    if not has_main(fname) and not bname.startswith('test_'):
+        if affected and fname.endswith('.py') and (tests := index.affected_tests(fname)):
+            tests = [os.path.relpath(t) for t in tests]
+            args = with_durations([module_fname] + tests)
+            return f'{pypath} {python} -m pytest {args} {module_fname} {" ".join(tests)}', _post[bname]
         if testfile := testfile_of(projects, path, bname, **kw):
-            if not os.path.exists(testfile) and fname.endswith('.py'):
+            if not exists(testfile) and fname.endswith('.py'):
                 print('autogen test file', testfile)
                 os.system(f'{sys.executable} -mipd code make_testfile {fname} {testfile}')
                 os.system(f'subl {testfile}')
@@ -155,38 +189,57 @@ def dispatch(
         test()
         sys.exit()
 
-    python = python or sys.executable
-    pypath = f'PYTHONPATH={":".join(p for p in sys.path if "python3" not in p)}'
     if fname.endswith('.rst'):
         cmd = f'{pypath} {python} -m doctest {module_fname}'
-    elif pytest or (not file_has_main(fname) and bname.startswith('test_')):
+    elif pytest or (not has_main(fname) and bname.startswith('test_')):
         if module_fname == fname: fname = ''
-        cmd = f'{pypath} {python} -m pytest {pytest_args} {module_fname} {fname}'
+        tests = [f for f in (module_fname, fname) if f]
+        cmd = f'{pypath} {python} -m pytest {with_durations(tests)} {module_fname} {fname}'
     elif fname.endswith('.py') and bname != 'conftest.py':
         cmd = f'{pypath} {python} ' + fname
     else:
-        cmd = f'{pypath} {python} -mpytest {pytest_args}'
+        cmd = f'{pypath} {python} -mpytest {with_durations()}'
     return cmd, _post[bname]
 
-def main(projects, quiet=False, filter_build_log=False, **kw):
-    t = perf_counter()
-    cmd, post = dispatch(projects, kw['testfile'], **kw) if kw['testfile'] else (f'{sys.executable} -mpytest',
-                                                                                 '')
+@timed('run_tests_on_file')
+def main(projects, quiet=False, filter_build_log=False, server=False, index=False, **kw):
+    with timed('dispatch') as t_dispatch:
+        if index or kw.get('affected'):
+            from evn.tool.project_index import ProjectIndex
+            kw['index'] = ProjectIndex()
+        cmd, post = dispatch(projects, kw['testfile'], **kw) if kw['testfile'] else (f'{sys.executable} -mpytest',
+                                                                                     '')
+        if 'index' in kw: kw['index'].save()
     if not quiet:
         print('call:', sys.argv)
         print('cwd:', os.getcwd())
         print('cmd:', cmd)
         print(f'{" run_tests_on_file.py running cmd in cwd ":=^69}')
         sys.stdout.flush()
-    os.system(cmd)
-    os.system(post)
-    t = perf_counter() - t
+    with timed('cmd') as t_cmd:
+        if not server or run_cmd_in_server(cmd) is None:
+            os.system(cmd)
+    with timed('post') as t_post:
+        os.system(post)
+    t = t_dispatch.elapsed + t_cmd.elapsed + t_post.elapsed
     if filter_build_log:
         p = Path('sublime_build.log')
         assert p.exists()
 
     print(f'{f" run_tests_on_file.py done, time {t:7.3f} ":=^69}')
 
+def run_cmd_in_server(cmd, address=None):
+    """Run a dispatched 'VAR=... python args' cmd in the fork server; None if it isn't running or cmd isn't python"""
+    from evn.tool.fork_server import run_in_server as run_forked
+    words, env = shlex.split(cmd), dict(os.environ)
+    while words and '=' in words[0] and not words[0].startswith('-'):
+        name, _, value = words.pop(0).partition('=')
+        env[name] = value
+    if len(words) < 2 or words[0] != sys.executable: return None
+    argv = words[1:]
+    if argv[0].startswith('-m') and len(argv[0]) > 2: argv = ['-m', argv[0][2:]] + argv[1:]
+    return run_forked(argv, env, address=address)
+
 if __name__ == '__main__':
     args = get_args(sys.argv)
     main(file_mappings=_file_mappings, overrides=_overrides, **args)
@@ -0,0 +1,158 @@
+"""
+group near-duplicate tracebacks
+
+The same failure reported from a different line, object address, temp dir or with different numbers in its
+message otherwise shows up as many "unique" traces. Traces are first normalized (see trace_normalizers) and
+deduplicated exactly on the normalized text; the remaining distinct traces are then clustered by the
+Jaccard similarity of their frame sequences, estimated with MinHash and bucketed with LSH, so the work grows
+linearly with the number of traces rather than with the number of pairs.
+"""
+
+from dataclasses import dataclass, field
+import hashlib
+import io
+import random
+import re
+from evn.tool.filter_python_output import TraceInfo, collect_python_error_traces
+
+trace_normalizers = {}
+
+def register_trace_normalizer(name, pattern, replacement):
+    """Add a regex substitution applied by normalize_trace, in registration order. Reusing a name replaces it.
+
+    Example:
+        >>> register_trace_normalizer('job', r'job-[a-z0-9]+', 'job-?')
+        >>> normalize_trace('job-a7x12 failed after 3 tries')
+        'job-? failed after N tries'
+        >>> del trace_normalizers['job']
+    """
+    trace_normalizers[name] = (re.compile(pattern), replacement)
+
+register_trace_normalizer('line_number', r', line \d+', ', line N')
+register_trace_normalizer('hex_address', r'0x[0-9a-fA-F]+', '0x?')
+register_trace_normalizer('temp_dir', r'(/private)?(/tmp|/var/tmp|/var/folders)(/[^/\s"\':]+)+', '<tmp>')
+register_trace_normalizer('temp_name', r'\btmp[\w-]{6,}', '<tmp>')
+register_trace_normalizer('uuid', r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}', '<uuid>')
+register_trace_normalizer('caret', r'(?m)^\s*[~^]+\s*$\n?', '')
+register_trace_normalizer('number', r'(?<![\w.])[-+]?\d+(\.\d+)?([eE][-+]?\d+)?(?![\w.])', 'N')
+
+def normalize_trace(trace):
+    """Apply the registered trace_normalizers to trace.
+
+    Example:
+        >>> normalize_trace('  File "/tmp/pytest-7/a.py", line 12, in f\\nValueError: <Foo at 0x7f3a> got 3.5')
+        '  File "<tmp>", line N, in f\\nValueError: <Foo at 0x?> got N'
+    """
+    for pattern, replacement in trace_normalizers.values():
+        trace = pattern.sub(replacement, trace)
+    return trace
+
+re_frame = re.compile(r'\s*File "([^"]*)", line \w+, in (.*)')
+
+def trace_features(trace):
+    """Set of features compared between traces: the frames, pairs of consecutive frames and the error.
+
+    Called on normalized traces. The source lines are left out, they mostly repeat the frame.
+    """
+    frames, error = [], ''
+    for line in trace.splitlines():
+        if m := re_frame.match(line): frames.append(f'{m[1]}:{m[2]}')
+        elif line and not line[0].isspace() and not re_traceback_header.match(line): error = line
+    error_type = error.split(':')[0]
+    features = {f'error {error_type}', f'message {error}'}
+    features.update(f'frame {f}' for f in frames)
+    features.update(f'call {a} -> {b}' for a, b in zip(frames, frames[1:]))
+    return features
+
+re_traceback_header = re.compile(r'Traceback \(most recent call last\):|During handling|The above exception')
+
+class MinHasher:
+    """MinHash signatures of feature sets: the fraction of equal entries estimates the Jaccard similarity.
+
+    Example:
+        >>> hasher = MinHasher(num_perm=128)
+        >>> a, b = hasher({'x', 'y', 'z'}), hasher({'x', 'y', 'w'})
+        >>> round(hasher.similarity(a, a), 2), 0.2 < hasher.similarity(a, b) < 0.8
+        (1.0, True)
+    """
+    prime = (1 << 61) - 1
+
+    def __init__(self, num_perm=64, seed=0):
+        rng = random.Random(seed)
+        self.perms = [(rng.randrange(1, self.prime), rng.randrange(self.prime)) for _ in range(num_perm)]
+
+    def __call__(self, features):
+        hashes = [int.from_bytes(hashlib.blake2b(f.encode(), digest_size=8).digest(), 'little')
+                  for f in features]
+        if not hashes: return (0, ) * len(self.perms)
+        return tuple(min((a*h + b) % self.prime for h in hashes) for a, b in self.perms)
+
+    @staticmethod
+    def similarity(sig1, sig2):
+        return sum(a == b for a, b in zip(sig1, sig2)) / len(sig1)
+
+@dataclass
+class TraceCluster:
+    """Near-duplicate traces: an example trace, total occurrences and the keys of the member traces."""
+    trace: str
+    count: int = 0
+    members: list = field(default_factory=list)
+
+def cluster_traces(traces, threshold=0.7, num_perm=64, bands=16):
+    """Group near-duplicate traces.
+
+    Args:
+        traces: dict of key -> trace (str or TraceInfo, e.g. TracebackCollector.traces), or an iterable of
+            traces, keyed by position
+        threshold: minimum estimated Jaccard similarity of trace_features to join a cluster
+        num_perm: MinHash signature length
+        bands: LSH bands; num_perm must be a multiple. More bands find less similar candidates
+    Returns:
+        list of TraceCluster, most frequent first
+
+    Example:
+        >>> trace = 'Traceback (most recent call last):\\n  File "a.py", line {}, in f\\nKeyError: {}'
+        >>> clusters = cluster_traces([trace.format(1, 10), trace.format(2, 20), 'ValueError: x'])
+        >>> [(c.count, c.members) for c in clusters]
+        [(2, [0, 1]), (1, [2])]
+    """
+    assert num_perm % bands == 0, 'num_perm must be a multiple of bands'
+    if not isinstance(traces, dict): traces = dict(enumerate(traces))
+    hasher, rows = MinHasher(num_perm), num_perm // bands
+    clusters, by_text, buckets = [], {}, {}
+    for key, trace in traces.items():
+        info = trace if isinstance(trace, TraceInfo) else TraceInfo(trace)
+        text = normalize_trace(info.trace)
+        if (i := by_text.get(text)) is None:
+            sig = hasher(trace_features(text))
+            bucket_keys = [(band, sig[band * rows:(band+1) * rows]) for band in range(bands)]
+            for bucket_key in bucket_keys:
+                j, rep_sig = buckets.get(bucket_key, (None, None))
+                if j is not None and hasher.similarity(sig, rep_sig) >= threshold:
+                    i = j
+                    break
+            else:
+                i = len(clusters)
+                clusters.append(TraceCluster(info.trace))
+            for bucket_key in bucket_keys:
+                buckets.setdefault(bucket_key, (i, sig))
+            by_text[text] = i
+        clusters[i].count += info.count
+        clusters[i].members.append(key)
+    return sorted(clusters, key=lambda c: -c.count)
+
+def create_clustered_errors_log_report(clusters):
+    """Like create_errors_log_report, one entry per TraceCluster."""
+    with io.StringIO() as out:
+        out.write(f"Clustered Stack Traces Report ({len(clusters)} clusters):\n")
+        out.write("="*80 + "\n\n")
+        for cluster in clusters:
+            out.write(f"{cluster.trace}\n")
+            out.write(f"[{cluster.count} occurrences of {len(cluster.members)} distinct traces]\n")
+            out.write("-"*80 + "\n\n")
+        return out.getvalue()
+
+def analyze_python_errors_log_clusters(text, threshold=0.7):
+    """Like analyze_python_errors_log, but near-duplicate traces are reported together."""
+    clusters = cluster_traces(collect_python_error_traces(text).traces, threshold)
+    return create_clustered_errors_log_report(clusters)
@@ -6,7 +6,7 @@ from packaging.tags import sys_tags
 
 nox.options.sessions = ['test_matrix']
 # nox.options.sessions = ['test_matrix', 'build']
-sesh = dict(python=["3.9", "3.10", "3.11", "3.12", "3.13"], venv_backend='uv')
+sesh = dict(python=["3.9", "3.10", "3.11", "3.12", "3.13", "3.13t"], venv_backend='uv')
 
 @nox.session(**sesh)
 def test_matrix(session):